@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 # MIDDLEWARE
 # ======================================================
 MIDDLEWARE = [
+    "aip_project.tracing.TracingMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
 
@@ -101,10 +102,27 @@ TEMPLATES = [
 # ======================================================
 # DATABASE (NO DATABASE REQUIRED)
 # ======================================================
+# SQLite waits up to "timeout" seconds for a lock instead of failing with
+# "database is locked". WAL mode is switched on per connection in
+# processing_app.apps.
+#
+# Under ASGI (uvicorn, the deployed server) each sync view runs on its own
+# thread, so persistent connections are never reused and only linger; as
+# Django advises for async, they close after every request by default.
+# Status polling is kept off the database by processing_app.status_cache.
+# DB_CONN_MAX_AGE > 0 only helps when serving through WSGI.
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", 0)),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "timeout": int(os.getenv("DB_BUSY_TIMEOUT", 20)),
+        },
+        # On disk (not SQLite's shared in-memory cache) so tests get the same
+        # WAL locking as the real database
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
@@ -141,3 +159,120 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 NINJA_PAGINATION_CLASS = "ninja.pagination.PageNumberPagination"
 NINJA_PAGINATION_PER_PAGE = 100
 NINJA_MAX_PER_PAGE_SIZE = 1000
+
+
+# ======================================================
+# PROCESSING PIPELINE
+# ======================================================
+# Max number of project pipelines allowed to run at once on this node, and
+# the total worker slots they share: a pipeline's pool takes up to
+# PIPELINE_WORKERS of the free slots. Extra jobs wait in a queue.
+PROCESSING_CPU_BUDGET = int(
+    os.getenv("PROCESSING_CPU_BUDGET", os.cpu_count() or 1)
+)
+
+# Chunk size advertised to clients of the resumable dataset upload API
+DATASET_UPLOAD_CHUNK_SIZE = int(
+    os.getenv("DATASET_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024)
+)
+
+# Largest total uncompressed size (bytes) an uploaded dataset archive may
+# extract to; 0 only checks it against free disk space
+DATASET_UPLOAD_MAX_EXTRACTED_BYTES = int(
+    os.getenv("DATASET_UPLOAD_MAX_EXTRACTED_BYTES", 20 * 1024 ** 3)
+)
+
+# Checkpoint pipeline progress every N images so a restart can resume
+PIPELINE_CHECKPOINT_EVERY = int(os.getenv("PIPELINE_CHECKPOINT_EVERY", 25))
+
+# Upper bound (seconds) on a single Cloudinary upload; also bounds how long
+# a cancellation request can take to be honoured
+PIPELINE_UPLOAD_TIMEOUT = int(os.getenv("PIPELINE_UPLOAD_TIMEOUT", 60))
+
+# RSS budget (MB) for memory-bounded processing; 0 keeps the default
+# in-memory mode. Can be overridden per request via memory_budget_mb.
+PIPELINE_MEMORY_BUDGET_MB = int(os.getenv("PIPELINE_MEMORY_BUDGET_MB", 0))
+
+# Result records held before flushing to the spool, and (memory-bounded mode) how
+# many encoded images the reader may load ahead of the decoder
+PIPELINE_RESULT_BATCH = int(os.getenv("PIPELINE_RESULT_BATCH", 100))
+PIPELINE_PREFETCH_DEPTH = int(os.getenv("PIPELINE_PREFETCH_DEPTH", 4))
+
+# How a pipeline executes its per-image stages (decode, labels, render,
+# encode, upload): "serial" (inline), "thread", "process" or "asyncio".
+# PIPELINE_WORKERS caps one pipeline's pool for the non-serial backends.
+PIPELINE_BACKEND = os.getenv("PIPELINE_BACKEND", "serial")
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", os.cpu_count() or 1))
+
+# Process backend: size (MB) of each shared-memory slot used to hand decoded
+# frames to workers without pickling; PIPELINE_WORKERS * 2 slots are mapped.
+# The ring is reserved up front; if /dev/shm can't hold it (Docker's default
+# is 64 MB) frames are pickled instead, as are larger frames. 0 disables it.
+PIPELINE_SHM_SLOT_MB = int(os.getenv("PIPELINE_SHM_SLOT_MB", 48))
+
+# Cloudinary folder for annotated images; public IDs inside it are content
+# hashes, so identical renditions are uploaded only once
+CLOUDINARY_UPLOAD_FOLDER = os.getenv("CLOUDINARY_UPLOAD_FOLDER", "aip_annotated")
+
+# Optional ONNX YOLO model run through cv2.dnn for images without a label
+# file. Empty disables inference (unlabelled images get zero detections).
+PIPELINE_DETECTOR_MODEL = os.getenv("PIPELINE_DETECTOR_MODEL", "")
+PIPELINE_DETECTOR_INPUT_SIZE = int(os.getenv("PIPELINE_DETECTOR_INPUT_SIZE", 640))
+PIPELINE_DETECTOR_CONF = float(os.getenv("PIPELINE_DETECTOR_CONF", 0.25))
+PIPELINE_DETECTOR_NMS = float(os.getenv("PIPELINE_DETECTOR_NMS", 0.45))
+PIPELINE_DETECTOR_BATCH = int(os.getenv("PIPELINE_DETECTOR_BATCH", 8))
+PIPELINE_DETECTOR_THREADS = int(os.getenv("PIPELINE_DETECTOR_THREADS", 0))
+
+# Seconds a ProjectStatus read from the DB is reused before re-reading. Jobs
+# running in this process are always served from memory.
+PROJECT_STATUS_CACHE_TTL = float(os.getenv("PROJECT_STATUS_CACHE_TTL", 1.0))
+
+# Background exports: public base URL used in the emailed download link, and
+# how long finished archives are kept before being pruned
+EXPORT_LINK_BASE_URL = os.getenv("EXPORT_LINK_BASE_URL", "http://localhost:8000")
+EXPORT_TTL_HOURS = float(os.getenv("EXPORT_TTL_HOURS", 24))
+
+# start-processing with preview=true: images sampled (stratified by label
+# class) by default and at most, longest side of the low-res renditions, and
+# how many sample images are also timed at full resolution for the estimate
+PREVIEW_SAMPLE_SIZE = int(os.getenv("PREVIEW_SAMPLE_SIZE", 50))
+PREVIEW_MAX_SAMPLE_SIZE = int(os.getenv("PREVIEW_MAX_SAMPLE_SIZE", 500))
+PREVIEW_MAX_SIDE = int(os.getenv("PREVIEW_MAX_SIDE", 640))
+PREVIEW_TIMING_SAMPLES = int(os.getenv("PREVIEW_TIMING_SAMPLES", 3))
+
+# Label files are only read for a random pool of sample_size * this many
+# images; class shares of the whole dataset are extrapolated from the pool
+PREVIEW_STRATIFY_POOL = int(os.getenv("PREVIEW_STRATIFY_POOL", 10))
+
+
+# ======================================================
+# RATE LIMITS (TOKEN BUCKET PER CLIENT IP)
+# ======================================================
+# "N/period" allows bursts of N and refills N tokens per period (s/min/hour).
+# "processing" covers the polling endpoints (project-status, get-result,
+# get-analytics); start/cancel-processing have their own bucket so a client
+# with many polling tabs can still cancel or start a job.
+RATE_LIMITS = {
+    "auth_login": os.getenv("RATE_LIMIT_AUTH_LOGIN", "10/min"),
+    "processing": os.getenv("RATE_LIMIT_PROCESSING", "600/min"),
+    "processing_control": os.getenv("RATE_LIMIT_PROCESSING_CONTROL", "30/min"),
+}
+
+# Reverse proxies (IPs or CIDRs, comma-separated) whose X-Forwarded-For is
+# believed when identifying clients; empty means the header is ignored
+TRUSTED_PROXIES = [p.strip() for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()]
+
+
+# ======================================================
+# TRACING (SAMPLED SPAN TREES)
+# ======================================================
+# Fraction of API requests / pipeline jobs traced (0 disables, 1 traces all).
+# Each sampled trace is written to TRACE_DIR as "chrome" (chrome://tracing,
+# Perfetto) or "otel" (OTLP/JSON); only the newest TRACE_MAX_FILES are kept.
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+TRACE_PIPELINE_SAMPLE_RATE = float(os.getenv("TRACE_PIPELINE_SAMPLE_RATE", 0))
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "chrome")
+TRACE_DIR = os.getenv("TRACE_DIR", os.path.join(BASE_DIR, "traces"))
+TRACE_MAX_FILES = int(os.getenv("TRACE_MAX_FILES", 500))
+TRACE_PATH_PREFIX = os.getenv("TRACE_PATH_PREFIX", "/api/")
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "aip-backend")
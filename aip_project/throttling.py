@@ -0,0 +1,166 @@
+import time
+import threading
+import ipaddress
+from functools import lru_cache, wraps
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import JsonResponse
+
+# ======================================================
+# SINGLE-FLIGHT (REQUEST COALESCING)
+# ======================================================
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run ``fn`` once per key at a time; concurrent callers with the same
+    key wait for the first one and share its result (or exception).
+
+    Nothing is cached: once the call finishes the next caller runs ``fn``
+    again, so results are never older than the in-flight computation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+        return call.result
+
+
+# ======================================================
+# TOKEN BUCKET RATE LIMITING
+# ======================================================
+
+_PERIODS = {"s": 1, "sec": 1, "second": 1, "m": 60, "min": 60, "minute": 60,
+            "h": 3600, "hour": 3600}
+
+
+def parse_rate(rate: str):
+    """``"10/min"`` -> (capacity 10, refill 10/60 tokens per second)."""
+    count, _, period = rate.partition("/")
+    capacity = int(count)
+    seconds = _PERIODS[period.strip().lower()]
+    return capacity, capacity / seconds
+
+
+class TokenBucketLimiter:
+    """Per-client token buckets; ``capacity`` is the allowed burst."""
+
+    MAX_CLIENTS = 10000
+
+    def __init__(self, capacity: int, refill_per_second: float):
+        self.capacity = capacity
+        self.refill = refill_per_second
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()   # key -> (tokens, updated_at)
+
+    def acquire(self, key: str):
+        """Take a token for ``key``. Returns (allowed, retry_after_seconds)."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.refill)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+
+        retry_after = 0 if allowed else (1 - tokens) / self.refill
+        return allowed, retry_after
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _limiter(scope: str):
+    with _limiters_lock:
+        limiter = _limiters.get(scope)
+        if limiter is None:
+            limiter = _limiters[scope] = TokenBucketLimiter(*parse_rate(settings.RATE_LIMITS[scope]))
+        return limiter
+
+
+@lru_cache(maxsize=8)
+def _parse_proxies(proxies: tuple):
+    return [ipaddress.ip_network(p, strict=False) for p in proxies]
+
+
+def _trusted_proxies():
+    return _parse_proxies(tuple(settings.TRUSTED_PROXIES))
+
+
+def _is_trusted(addr: str, proxies) -> bool:
+    try:
+        ip = ipaddress.ip_address(addr)
+    except ValueError:
+        return False
+    return any(ip in net for net in proxies)
+
+
+def client_ip(request) -> str:
+    """REMOTE_ADDR, unless it is a trusted proxy: then the right-most
+    X-Forwarded-For hop that isn't one. Clients can't pick their own key."""
+    remote = request.META.get("REMOTE_ADDR", "")
+    proxies = _trusted_proxies()
+    if not proxies or not _is_trusted(remote, proxies):
+        return remote
+
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    for hop in reversed([h.strip() for h in forwarded.split(",") if h.strip()]):
+        if not _is_trusted(hop, proxies):
+            return hop
+    return remote
+
+
+def rate_limited(scope: str):
+    """Decorate an API operation with the ``RATE_LIMITS[scope]`` bucket.
+
+    Over-limit clients get a 429 with Retry-After.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            allowed, retry_after = _limiter(scope).acquire(client_ip(request))
+            if not allowed:
+                response = JsonResponse({"message": "Too many requests"}, status=429)
+                response["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+                return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
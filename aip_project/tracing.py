@@ -0,0 +1,223 @@
+import os
+import json
+import time
+import random
+import secrets
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+from ninja.renderers import JSONRenderer
+
+# ======================================================
+# SAMPLED SPAN TRACING
+# ======================================================
+# A sampled request or pipeline job records a span tree (request, DB
+# queries, file loads, JSON serialization; per-image pipeline stages) and
+# writes it to TRACE_DIR as one Chrome trace or OpenTelemetry (OTLP/JSON)
+# file. Unsampled work only pays a random() call at the entry point: span()
+# is a no-op when no trace is active.
+
+_trace = contextvars.ContextVar("aip_trace", default=None)
+_parent = contextvars.ContextVar("aip_span_parent", default=None)
+
+
+def _span_id() -> str:
+    return secrets.token_hex(8)
+
+
+class Trace:
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.trace_id = secrets.token_hex(16)
+        self.spans = []
+        self.root = {}      # attributes of the root span
+        self._lock = threading.Lock()
+
+    def add(self, name, start_ns, end_ns, parent_id=None, attrs=None,
+            pid=None, tid=None, span_id=None):
+        span = {
+            "span_id": span_id or _span_id(),
+            "parent_id": parent_id,
+            "name": name,
+            "start_ns": start_ns,
+            "end_ns": end_ns,
+            "pid": pid or os.getpid(),
+            "tid": tid or threading.get_ident(),
+            "attrs": attrs or {},
+        }
+        with self._lock:
+            self.spans.append(span)
+        return span["span_id"]
+
+
+def active() -> bool:
+    return _trace.get() is not None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Record ``name`` as a child of the current span, if tracing. Yields
+    the span's attribute dict so callers can add to it."""
+    trace = _trace.get()
+    if trace is None:
+        yield attrs
+        return
+
+    span_id = _span_id()
+    parent_id = _parent.get()
+    token = _parent.set(span_id)
+    start = time.time_ns()
+    try:
+        yield attrs
+    finally:
+        _parent.reset(token)
+        trace.add(name, start, time.time_ns(), parent_id, attrs, span_id=span_id)
+
+
+def add_span(name: str, start_ns: int, end_ns: int, parent_id=None, **attrs):
+    """Record an already-timed span (e.g. measured in a worker process)."""
+    trace = _trace.get()
+    if trace is None:
+        return None
+    pid = attrs.pop("pid", None)
+    tid = attrs.pop("tid", None)
+    return trace.add(name, start_ns, end_ns, parent_id or _parent.get(), attrs, pid, tid)
+
+
+def _db_span(execute, sql, params, many, context):
+    with span("db.query", sql=sql[:500], many=many):
+        return execute(sql, params, many, context)
+
+
+def _sampled(rate: float) -> bool:
+    return rate > 0 and random.random() < rate
+
+
+@contextmanager
+def start_trace(kind: str, name: str, rate: float, **attrs):
+    """Sample a new trace rooted at ``name``; yields the Trace or None."""
+    if _trace.get() is not None or not _sampled(rate):
+        yield None
+        return
+
+    trace = Trace(kind)
+    trace_token = _trace.set(trace)
+    try:
+        with connection.execute_wrapper(_db_span):
+            with span(name, **attrs) as trace.root:
+                yield trace
+    finally:
+        _trace.reset(trace_token)
+        try:
+            export(trace)
+        except Exception as e:
+            print("Trace export failed:", e)
+
+
+# ======================================================
+# EXPORT (CHROME TRACE / OTLP JSON)
+# ======================================================
+
+def chrome_trace(trace: Trace) -> dict:
+    events = []
+    for s in trace.spans:
+        events.append({
+            "name": s["name"],
+            "cat": trace.kind,
+            "ph": "X",
+            "ts": s["start_ns"] / 1000,
+            "dur": max(0, s["end_ns"] - s["start_ns"]) / 1000,
+            "pid": s["pid"],
+            "tid": s["tid"],
+            "args": dict(s["attrs"], span_id=s["span_id"], parent_id=s["parent_id"]),
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "otherData": {"trace_id": trace.trace_id, "kind": trace.kind}}
+
+
+def _otel_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otel_trace(trace: Trace) -> dict:
+    spans = []
+    for s in trace.spans:
+        attrs = dict(s["attrs"], **{"process.pid": s["pid"], "thread.id": s["tid"]})
+        spans.append({
+            "traceId": trace.trace_id,
+            "spanId": s["span_id"],
+            "parentSpanId": s["parent_id"] or "",
+            "name": s["name"],
+            "kind": 2 if trace.kind == "request" and not s["parent_id"] else 1,
+            "startTimeUnixNano": str(s["start_ns"]),
+            "endTimeUnixNano": str(s["end_ns"]),
+            "attributes": [{"key": k, "value": _otel_value(v)} for k, v in attrs.items()],
+        })
+    return {"resourceSpans": [{
+        "resource": {"attributes": [
+            {"key": "service.name", "value": {"stringValue": settings.TRACE_SERVICE_NAME}},
+        ]},
+        "scopeSpans": [{"scope": {"name": "aip_project.tracing"}, "spans": spans}],
+    }]}
+
+
+def _prune(trace_dir: str, keep: int):
+    entries = sorted(os.scandir(trace_dir), key=lambda e: e.stat().st_mtime)
+    for entry in entries[:max(0, len(entries) - keep)]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def export(trace: Trace) -> str:
+    fmt = settings.TRACE_FORMAT
+    payload = otel_trace(trace) if fmt == "otel" else chrome_trace(trace)
+
+    os.makedirs(settings.TRACE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(settings.TRACE_DIR, f"{trace.kind}-{stamp}-{trace.trace_id[:12]}.{fmt}.json")
+    with open(path, "w") as f:
+        json.dump(payload, f)
+
+    _prune(settings.TRACE_DIR, settings.TRACE_MAX_FILES)
+    return path
+
+
+# ======================================================
+# DJANGO / NINJA HOOKS
+# ======================================================
+
+class TracingMiddleware:
+    """Trace a sample of requests under TRACE_PATH_PREFIX (the Ninja API)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith(settings.TRACE_PATH_PREFIX):
+            return self.get_response(request)
+
+        with start_trace("request", f"{request.method} {request.path}",
+                         settings.TRACE_SAMPLE_RATE, method=request.method,
+                         path=request.path) as trace:
+            response = self.get_response(request)
+            if trace is not None:
+                trace.root["status"] = response.status_code
+                response["X-Trace-Id"] = trace.trace_id
+        return response
+
+
+class TracingJSONRenderer(JSONRenderer):
+    def render(self, request, data, *, response_status):
+        with span("json.serialize"):
+            return super().render(request, data, response_status=response_status)
@@ -4,6 +4,7 @@ from django.views.generic import RedirectView
 from django.http import HttpResponse
 from ninja import NinjaAPI
 
+from aip_project.tracing import TracingJSONRenderer
 from auth_app.api import auth_router
 from processing_app.api import processing_router
 
@@ -15,6 +16,7 @@ api = NinjaAPI(
     title="AIP APIs",
     version="1.0.0",
     description="AI Processing Backend",
+    renderer=TracingJSONRenderer(),
 )
 
 
@@ -3,6 +3,8 @@ from datetime import datetime, timedelta
 import jwt
 from django.conf import settings
 
+from aip_project.throttling import rate_limited
+
 from .otp_service import generate_otp, send_otp_email
 from .otp_store import save_otp, verify_otp, is_verified
 
@@ -56,6 +58,7 @@ USERS_DB = {
 # LOGIN
 # =========================
 @auth_router.post("/login", response={200: MessageResponse, 401: MessageResponse})
+@rate_limited("auth_login")
 def login(request, data: LoginRequest):
     username = data.username.lower()
     user = USERS_DB.get(username)
@@ -1,16 +1,20 @@
 import os
 import random
-import requests
 
 # =========================
 # CONFIG
 # =========================
 
-BREVO_API_KEY = os.getenv("BREVO_API_KEY")
-SENDER_EMAIL = os.getenv("SENDER_EMAIL")
+def _brevo_config():
+    """Read Brevo credentials when an email is sent, not at import time, so
+    workers, manage.py and tests start without the secrets."""
+    api_key = os.getenv("BREVO_API_KEY")
+    sender_email = os.getenv("SENDER_EMAIL")
 
-if not BREVO_API_KEY or not SENDER_EMAIL:
-    raise Exception("❌ BREVO_API_KEY or SENDER_EMAIL not set in environment variables!")
+    if not api_key or not sender_email:
+        raise Exception("❌ BREVO_API_KEY or SENDER_EMAIL not set in environment variables!")
+
+    return api_key, sender_email
 
 
 # =========================
@@ -26,17 +30,20 @@ def generate_otp() -> str:
 # =========================
 
 def _send_email(to_email: str, subject: str, body: str):
+    import requests
+
+    api_key, sender_email = _brevo_config()
 
     url = "https://api.brevo.com/v3/smtp/email"
 
     headers = {
         "accept": "application/json",
-        "api-key": BREVO_API_KEY,
+        "api-key": api_key,
         "content-type": "application/json",
     }
 
     payload = {
-        "sender": {"email": SENDER_EMAIL, "name": "My App"},
+        "sender": {"email": sender_email, "name": "My App"},
         "to": [{"email": to_email}],
         "subject": subject,
         "textContent": body,
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""Measure worker cold start: time and peak RSS to import the Django app and
+build the URLconf (what every uvicorn worker, manage.py command and test run
+pays before serving anything).
+
+Each run is a fresh interpreter, so nothing is warm in sys.modules.
+
+    python bench_cold_start.py [--runs 10]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CHILD = r"""
+import os, sys, time, json, resource
+t0 = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aip_project.settings")
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - t0
+heavy = [m for m in ("cv2", "numpy", "yaml", "natsort", "cloudinary", "requests") if m in sys.modules]
+print(json.dumps({
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": heavy,
+}))
+"""
+
+
+def run_once(env):
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = BASE_DIR + os.pathsep + env.get("PYTHONPATH", "")
+
+    run_once(env)  # warm the OS page cache so runs are comparable
+    results = [run_once(env) for _ in range(args.runs)]
+
+    seconds = [r["seconds"] for r in results]
+    rss = [r["max_rss_mb"] for r in results]
+    print(f"runs:            {args.runs}")
+    print(f"boot time (ms):  median {statistics.median(seconds) * 1000:.1f}  "
+          f"min {min(seconds) * 1000:.1f}  max {max(seconds) * 1000:.1f}")
+    print(f"peak RSS (MB):   median {statistics.median(rss):.1f}")
+    print(f"heavy modules:   {', '.join(results[-1]['heavy_modules']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
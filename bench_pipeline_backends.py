@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+"""Compare pipeline backends on the same workload: run the per-image stages
+(decode, parse labels, render, encode) over a dataset with each runner and
+report wall time and throughput.
+
+Uploads and DB writes are left out so the numbers reflect the stage graph
+itself; annotated images go to a temporary directory. --decode-in-parent
+decodes in the pipeline process first, as the prefetch/detector paths do,
+so the process backend has to ship frames to its workers (see
+PIPELINE_SHM_SLOT_MB).
+
+    python bench_pipeline_backends.py "Datasets/Mining Vehicles.v1i.yolov12" \
+        [--backends serial thread process asyncio] [--workers 4] [--repeat 3] \
+        [--decode-in-parent] [--shm-slot-mb 48]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def run_backend(backend, workers, dataset_path, out_dir, decode_in_parent=False, slot_bytes=0):
+    import yaml
+    from processing_app.runners import get_runner
+    from processing_app.stages import ImageJob, scan_images, decode_image, process_image
+
+    with open(os.path.join(dataset_path, "data.yaml")) as f:
+        class_names = yaml.safe_load(f)["names"]
+
+    images_dir = os.path.join(dataset_path, "train", "images")
+    labels_dir = os.path.join(dataset_path, "train", "labels")
+    names = scan_images(images_dir)
+
+    jobs = (
+        ImageJob(idx, name, images_dir, labels_dir, os.path.join(out_dir, name), class_names)
+        for idx, name in enumerate(names, start=1)
+    )
+    if decode_in_parent:
+        jobs = (decode_image(job) for job in jobs)
+
+    start = time.perf_counter()
+    with get_runner(backend, workers, slot_bytes) as runner:
+        done = sum(1 for job in runner.map(process_image, jobs) if job.ok)
+    return time.perf_counter() - start, done
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("dataset")
+    parser.add_argument("--backends", nargs="+", default=["serial", "thread", "process", "asyncio"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--decode-in-parent", action="store_true")
+    parser.add_argument("--shm-slot-mb", type=int, default=48)
+    args = parser.parse_args()
+
+    sys.path.insert(0, BASE_DIR)
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "aip_project.settings")
+    import django
+    django.setup()
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        run_backend("serial", 1, args.dataset, out_dir)  # warm the page cache
+
+        for backend in args.backends:
+            runs = [
+                run_backend(backend, args.workers, args.dataset, out_dir,
+                            args.decode_in_parent, args.shm_slot_mb * 1024 * 1024)
+                for _ in range(args.repeat)
+            ]
+            best, images = min(runs)
+            print(f"{backend:<8} best {best * 1000:8.1f} ms   "
+                  f"{images / best if best else 0:8.1f} img/s   ({images} images, {args.workers} workers)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,71 @@
 from ninja import Router, Schema, File
 from ninja.files import UploadedFile
 from datetime import date
-import os, cv2, yaml, json, natsort, threading, traceback
-import cloudinary
-import cloudinary.uploader
+from typing import Optional
+import os, json, threading, traceback
 from django.conf import settings
-from django.db import close_old_connections
+from django.db import IntegrityError, close_old_connections, connection
+from django.http import FileResponse
+from django.utils import timezone
 
+from aip_project.throttling import SingleFlight, rate_limited
+from aip_project import tracing
 from .models import ProjectStatus
+from . import status_cache
+from .detector import attach_detections, get_detector
+from .memory import MemoryTracker, RecordSpool, prefetch_frames
+from .runners import WorkerBudget, get_runner
+from .preview import run_preview
+from .stages import (
+    ImageJob, scan_images, label_path_for, decode_image,
+    process_image, upload_image, build_record,
+)
+from .dataset_upload import (
+    UploadError, create_upload, get_upload, write_chunk, start_finalize,
+)
+from .export import (
+    ExportError, FORMATS as EXPORT_FORMATS, collect_members, archive_stream,
+    file_stream, stream_response, export_path, prune_exports, start_background_export,
+)
+from .compression import (
+    write_compressed_variants, json_file_response,
+    not_modified_response, encoded_json_response,
+)
 from auth_app.otp_service import send_download_link_email, send_rejection_email
 
 processing_router = Router()
 
-# =====================================================
-# CLOUDINARY CONFIG (SAFE)
-# =====================================================
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")
-)
-
 # =====================================================
 # SCHEMAS
 # =====================================================
 class StartProcessRequest(Schema):
     project_id: str
+    resume: bool = True
+    memory_budget_mb: Optional[int] = None
+    preview: bool = False
+    sample_size: Optional[int] = None
+
+class CancelProcessRequest(Schema):
+    project_id: str
 
 class RejectionRequest(Schema):
     image_id: str
     image_url: str
 
+class UploadInitRequest(Schema):
+    project_id: str
+    filename: str
+    total_size: int
+    sha256: str
+
+class UploadCompleteRequest(Schema):
+    auto_start: bool = False
+
+class ExportRequest(Schema):
+    project_id: str
+    email: str
+    format: str = "zip"
+
 # =====================================================
 # PATHS
 # =====================================================
@@ -44,6 +79,9 @@ PROJECT_PATH_MAP = {
 
 OUTPUT_DIR = os.path.join(settings.BASE_DIR, "output_annotated_images")
 UPLOAD_DIR = os.path.join(settings.BASE_DIR, "uploaded_files")
+CHECKPOINT_DIR = os.path.join(settings.BASE_DIR, "checkpoints")
+EXPORT_DIR = os.path.join(settings.BASE_DIR, "exports")
+PREVIEW_DIR = os.path.join(settings.BASE_DIR, "previews")
 
 ALERTS_FILE = os.path.join(settings.BASE_DIR, "alerts-page.json")
 PROJECTS_FILE = os.path.join(settings.BASE_DIR, "projects-page.json")
@@ -54,8 +92,13 @@ DASHBOARD_DATA = os.path.join(settings.BASE_DIR, "dashboard_data.json")
 INDUSTRIES = os.path.join(settings.BASE_DIR, "industries.json")
 RECENT_PROJECTS = os.path.join(settings.BASE_DIR, "recent_projects.json")
 
+# Datasets added through the upload API (project_id -> dataset path)
+DATASET_REGISTRY = os.path.join(settings.BASE_DIR, "datasets_registry.json")
+
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+os.makedirs(EXPORT_DIR, exist_ok=True)
 
 # =====================================================
 # SAFE JSON HELPERS
@@ -63,7 +106,7 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 def safe_load_json(path, default):
     try:
         if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
+            with tracing.span("file.load", path=path), open(path, "r", encoding="utf-8") as f:
                 return json.load(f)
     except Exception as e:
         print("JSON load error:", path, e)
@@ -75,6 +118,17 @@ def safe_write_json(path, data):
             json.dump(data, f, indent=2)
     except Exception as e:
         print("JSON write error:", path, e)
+        return
+
+    write_compressed_variants(path)
+
+def register_dataset(project_id: str, dataset_path: str):
+    registry = safe_load_json(DATASET_REGISTRY, {})
+    registry[project_id] = dataset_path
+    safe_write_json(DATASET_REGISTRY, registry)
+    PROJECT_PATH_MAP[project_id] = dataset_path
+
+PROJECT_PATH_MAP.update(safe_load_json(DATASET_REGISTRY, {}))
 
 # =====================================================
 # ANALYTICS
@@ -117,96 +171,135 @@ def update_analytics_data(final_data: dict, project_id: str):
 # =====================================================
 # MAIN PIPELINE
 # =====================================================
-def run_pipeline(project_id: str, dataset_path: str):
-    close_old_connections()
+# Global CPU budget: one slot per concurrently running project pipeline, and
+# one shared pool of worker slots the pipelines' runners are sized from
+PIPELINE_SLOTS = threading.BoundedSemaphore(max(1, settings.PROCESSING_CPU_BUDGET))
+WORKER_BUDGET = WorkerBudget(settings.PROCESSING_CPU_BUDGET)
+PROGRESS_EVERY = 10
 
-    ProjectStatus.objects.all().update(active=False, running=False)
+_running_projects = set()
+_cancel_events = {}
+_running_lock = threading.Lock()
 
-    status, _ = ProjectStatus.objects.update_or_create(
-        project_id=project_id,
-        defaults={"active": True, "running": True, "completed": False}
-    )
 
-    try:
-        yaml_path = os.path.join(dataset_path, "data.yaml")
-        if not os.path.exists(yaml_path):
-            raise Exception(f"Missing data.yaml in {dataset_path}")
+class PipelineCancelled(Exception):
+    pass
 
-        with open(yaml_path, "r") as f:
-            data = yaml.safe_load(f)
 
-        class_names = data["names"]
+def _save_progress(status: ProjectStatus, **fields):
+    for key, value in fields.items():
+        setattr(status, key, value)
+    ProjectStatus.objects.filter(pk=status.pk).update(**fields)
+    status_cache.publish(status)
 
-        images_dir = os.path.join(dataset_path, "train", "images")
-        labels_dir = os.path.join(dataset_path, "train", "labels")
 
-        if not os.path.exists(images_dir):
-            raise Exception(f"Missing images folder: {images_dir}")
+# =====================================================
+# CHECKPOINTS
+# =====================================================
+def _checkpoint_path(project_id: str):
+    return os.path.join(CHECKPOINT_DIR, f"{project_id}.json")
+
+def _spool_path(project_id: str):
+    return os.path.join(CHECKPOINT_DIR, f"{project_id}.records.jsonl")
+
+def save_checkpoint(project_id: str, dataset_path: str, done: int, last_image: str,
+                    spool_size: int):
+    """Persist progress after ``done`` images so a restart can resume.
+
+    Records stay in the append-only spool and are referenced by its flushed
+    size, so a checkpoint costs one batch flush however far the run is.
+    """
+    checkpoint = {
+        "project_id": project_id,
+        "dataset_path": dataset_path,
+        "next_index": done,
+        "last_image": last_image,
+        "spool_size": spool_size,
+    }
+    path = _checkpoint_path(project_id)
+    try:
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(path + ".tmp", path)
+    except Exception as e:
+        print("Checkpoint write error:", path, e)
 
-        final_data = {"project_id": project_id, "images": []}
+def load_checkpoint(project_id: str, dataset_path: str, name_at):
+    """Return a checkpoint that still matches the dataset listing, else None.
 
-        for idx, img_name in enumerate(natsort.natsorted(os.listdir(images_dir)), start=1):
-            if not img_name.lower().endswith((".jpg", ".jpeg", ".png")):
-                continue
+    ``name_at(n)`` gives the n-th (1-based) image name in processing order.
+    """
+    checkpoint = safe_load_json(_checkpoint_path(project_id), None)
+    if not checkpoint or checkpoint.get("dataset_path") != dataset_path:
+        return None
 
-            img_path = os.path.join(images_dir, img_name)
-            label_path = os.path.join(labels_dir, os.path.splitext(img_name)[0] + ".txt")
+    done = checkpoint.get("next_index", 0)
+    if done <= 0 or checkpoint.get("spool_size") is None:
+        return None
+    if name_at(done) != checkpoint.get("last_image"):
+        return None
+    return checkpoint
 
-            img = cv2.imread(img_path)
-            if img is None:
-                continue
+def clear_checkpoint(project_id: str):
+    for path in (_checkpoint_path(project_id), _spool_path(project_id)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
 
-            h, w = img.shape[:2]
-            count = 0
-            classes = set()
 
-            if os.path.exists(label_path):
-                with open(label_path, "r") as lf:
-                    for line in lf:
-                        parts = line.strip().split()
-                        if len(parts) != 5:
-                            continue
+def run_pipeline(project_id: str, dataset_path: str, resume: bool = True,
+                 memory_budget_mb: int = 0):
+    with tracing.start_trace("pipeline", "run_pipeline", settings.TRACE_PIPELINE_SAMPLE_RATE,
+                             project_id=project_id, backend=settings.PIPELINE_BACKEND):
+        _run_pipeline(project_id, dataset_path, resume, memory_budget_mb)
 
-                        cls, x, y, bw, bh = map(float, parts)
-                        label = class_names[int(cls)]
-                        count += 1
-                        classes.add(label)
 
-                        x1 = int((x - bw / 2) * w)
-                        y1 = int((y - bh / 2) * h)
-                        x2 = int((x + bw / 2) * w)
-                        y2 = int((y + bh / 2) * h)
+def _run_pipeline(project_id: str, dataset_path: str, resume: bool,
+                  memory_budget_mb: int):
+    close_old_connections()
 
-                        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 2)
-                        cv2.putText(img, label, (x1, max(20, y1 - 5)),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+    status = ProjectStatus.objects.get(project_id=project_id)
+    with _running_lock:
+        cancel = _cancel_events.setdefault(project_id, threading.Event())
 
-            out_path = os.path.join(OUTPUT_DIR, f"{project_id}_{img_name}")
-            cv2.imwrite(out_path, img)
+    if not resume:
+        clear_checkpoint(project_id)
 
-            image_url = ""
-            try:
-                upload = cloudinary.uploader.upload(out_path)
-                image_url = upload.get("secure_url", "")
-            except:
-                pass
-
-            final_data["images"].append({
-                "id": idx,
-                "mainImage": image_url,
-                "metrics": [
-                    {"label": "Total Objects", "value": str(count)},
-                    {"label": "Detected Classes", "value": ", ".join(classes) if classes else "None"}
-                ],
-                "_raw": {"count": count, "classes": list(classes)}
-            })
-
-        safe_write_json(os.path.join(settings.BASE_DIR, f"result_{project_id}.json"), final_data)
-        update_analytics_data(final_data, project_id)
+    try:
+        # Wait for a CPU slot, but stay responsive to cancellation while queued
+        with tracing.span("pipeline.queue"):
+            while not PIPELINE_SLOTS.acquire(timeout=0.5):
+                if cancel.is_set():
+                    raise PipelineCancelled()
+
+        try:
+            # The serial backend works on this thread; others size their pool
+            # from whatever share of the node's worker budget is free
+            wanted = 1 if settings.PIPELINE_BACKEND == "serial" else settings.PIPELINE_WORKERS
+            with tracing.span("pipeline.queue_workers"):
+                workers = WORKER_BUDGET.acquire(wanted, cancel)
+            if not workers:
+                raise PipelineCancelled()
 
+            try:
+                _save_progress(status, started_at=timezone.now())
+                _process_dataset(status, project_id, dataset_path, cancel, workers,
+                                 memory_budget_mb)
+            finally:
+                WORKER_BUDGET.release(workers)
+        finally:
+            PIPELINE_SLOTS.release()
+
+        clear_checkpoint(project_id)
         status.completed = True
 
+    except PipelineCancelled:
+        status.cancelled = True
+        status.error = "Cancelled"
+
     except Exception as e:
+        status.error = str(e)
         safe_write_json(
             os.path.join(settings.BASE_DIR, f"result_{project_id}.json"),
             {"error": str(e), "trace": traceback.format_exc()}
@@ -214,45 +307,288 @@ def run_pipeline(project_id: str, dataset_path: str):
 
     finally:
         status.running = False
-        status.active = True
-        status.save()
+        status.finished_at = timezone.now()
+        status.save(update_fields=[
+            "running", "completed", "cancelled", "processed_images",
+            "peak_rss_mb", "finished_at", "error",
+        ])
+        status_cache.publish(status, local=False)
+
+        with _running_lock:
+            _running_projects.discard(project_id)
+            _cancel_events.pop(project_id, None)
+
+        # This thread is done; don't leave a persistent connection behind
+        connection.close()
+
+
+def _process_dataset(status: ProjectStatus, project_id: str, dataset_path: str,
+                     cancel: threading.Event, workers: int, memory_budget_mb: int = 0):
+    # Heavy imports are deferred to the pipeline thread so workers boot fast
+    import yaml
+
+    yaml_path = os.path.join(dataset_path, "data.yaml")
+    if not os.path.exists(yaml_path):
+        raise Exception(f"Missing data.yaml in {dataset_path}")
+
+    with open(yaml_path, "r") as f:
+        data = yaml.safe_load(f)
+
+    class_names = data["names"]
+
+    images_dir = os.path.join(dataset_path, "train", "images")
+    labels_dir = os.path.join(dataset_path, "train", "labels")
+
+    if not os.path.exists(images_dir):
+        raise Exception(f"Missing images folder: {images_dir}")
+
+    bounded = memory_budget_mb > 0
+    tracker = MemoryTracker(memory_budget_mb * 1024 * 1024)
+
+    # ---- scan ----
+    # Natural order in every mode so record ids don't depend on the memory
+    # budget; the name list is small next to a single decoded frame.
+    image_names = scan_images(images_dir)
+    total = len(image_names)
+
+    def name_at(n):
+        return image_names[n - 1] if 0 < n <= total else None
+
+    checkpoint = load_checkpoint(project_id, dataset_path, name_at)
+
+    resume_from = checkpoint["next_index"] if checkpoint else 0
+    last_image = checkpoint["last_image"] if checkpoint else None
+
+    records = RecordSpool(_spool_path(project_id), settings.PIPELINE_RESULT_BATCH)
+    records.truncate(checkpoint["spool_size"] if checkpoint else 0)
+
+    def checkpoint_at(done):
+        save_checkpoint(project_id, dataset_path, done, last_image, records.flush())
+
+    _save_progress(status, total_images=total, processed_images=resume_from)
+
+    checkpoint_every = max(1, settings.PIPELINE_CHECKPOINT_EVERY)
+    pending = enumerate(image_names[resume_from:], start=resume_from + 1)
+
+    traced = tracing.active()
+
+    def job(idx, img_name, **fields):
+        return ImageJob(idx, img_name, images_dir, labels_dir,
+                        os.path.join(OUTPUT_DIR, f"{project_id}_{img_name}"),
+                        class_names, spans=[] if traced else None, **fields)
+
+    # ---- decode / parse labels ----
+    # Frames are decoded here only when the prefetcher (bounded mode) or the
+    # batched detector needs them, and for the detector only unlabelled
+    # images; everything else is decoded in the workers.
+    detector = get_detector()
+    decoded = None
+    if bounded or detector is not None:
+        if bounded:
+            decoded = prefetch_frames(images_dir, pending, settings.PIPELINE_PREFETCH_DEPTH, tracker)
+        else:
+            decoded = (
+                (idx, img_name,
+                 None if os.path.exists(label_path_for(labels_dir, img_name))
+                 else decode_image(job(idx, img_name)).frame)
+                for idx, img_name in pending
+            )
+        tagged = attach_detections(
+            decoded,
+            lambda img_name: label_path_for(labels_dir, img_name),
+            detector,
+            settings.PIPELINE_DETECTOR_BATCH,
+        )
+        jobs = (
+            job(idx, img_name, frame=img, decoded=bounded or img is not None,
+                detections=detections)
+            for idx, img_name, img, detections in tagged
+        )
+    else:
+        jobs = (job(idx, img_name) for idx, img_name in pending)
+
+    # ---- render / encode -> upload -> aggregate ----
+    runner = get_runner(settings.PIPELINE_BACKEND, workers,
+                        settings.PIPELINE_SHM_SLOT_MB * 1024 * 1024)
+    results = runner.io.map(upload_image, runner.map(process_image, jobs))
+
+    try:
+        for done in results:
+            idx = done.idx
+            if cancel.is_set():
+                status.processed_images = idx - 1
+                checkpoint_at(idx - 1)
+                raise PipelineCancelled()
+
+            if idx % PROGRESS_EVERY == 0:
+                _save_progress(status, processed_images=idx - 1)
+
+            if idx % checkpoint_every == 0:
+                checkpoint_at(idx - 1)
+
+            last_image = done.name
+            tracker.sample()
+
+            if done.spans:
+                _trace_image(done)
+
+            if done.ok:
+                records.append(build_record(done))
+    finally:
+        results.close()
+        runner.close()
+        if decoded is not None:
+            decoded.close()
+        status.peak_rss_mb = tracker.peak_mb
+
+    status.processed_images = total
+
+    result_path = os.path.join(settings.BASE_DIR, f"result_{project_id}.json")
+    with tracing.span("aggregate", images=total):
+        if bounded:
+            records.write_result(result_path, project_id)
+            update_analytics_data({"images": iter(records)}, project_id)
+        else:
+            final_data = {"project_id": project_id, "images": list(records)}
+            safe_write_json(result_path, final_data)
+            update_analytics_data(final_data, project_id)
+
+
+def _trace_image(job: ImageJob):
+    """Attach an image's stage timings (taken wherever the runner ran them)."""
+    start = min(s[1] for s in job.spans)
+    end = max(s[2] for s in job.spans)
+    image_span = tracing.add_span("image", start, end, idx=job.idx, image=job.name)
+    for stage, stage_start, stage_end, pid, tid in job.spans:
+        tracing.add_span(stage, stage_start, stage_end, parent_id=image_span, pid=pid, tid=tid)
 
 # =====================================================
 # APIs
 # =====================================================
-@processing_router.post("/start-processing", tags=["Project Processing"])
-def start_processing(request, data: StartProcessRequest):
-    dataset_path = PROJECT_PATH_MAP.get(data.project_id)
+def start_project(project_id: str, resume: bool = True, memory_budget_mb: int = None):
+    dataset_path = PROJECT_PATH_MAP.get(project_id)
     if not dataset_path:
         return {"error": "Invalid project_id"}
 
     if not os.path.exists(dataset_path):
         return {"error": f"Dataset not found: {dataset_path}"}
 
-    threading.Thread(target=run_pipeline, args=(data.project_id, dataset_path), daemon=True).start()
-    return {"message": f"Processing started for {data.project_id}"}
+    with _running_lock:
+        if project_id in _running_projects:
+            return {"error": f"{project_id} is already processing"}
+        _running_projects.add(project_id)
+
+    # "active" only selects the default project for calls without project_id;
+    # other projects keep running and stay queryable by id.
+    #
+    # Plain autocommit statements only: a read-then-write transaction (like
+    # update_or_create) fails at once with "database is locked" under WAL
+    # when a pipeline commits between its read and its write.
+    ProjectStatus.objects.exclude(project_id=project_id).update(active=False)
+    fields = {
+        "active": True, "running": True, "completed": False, "cancelled": False,
+        "total_images": 0, "processed_images": 0,
+        "peak_rss_mb": 0, "started_at": None, "finished_at": None, "error": "",
+    }
+    if not ProjectStatus.objects.filter(project_id=project_id).update(**fields):
+        try:
+            ProjectStatus.objects.create(project_id=project_id, **fields)
+        except IntegrityError:
+            ProjectStatus.objects.filter(project_id=project_id).update(**fields)
+    status = ProjectStatus.objects.get(project_id=project_id)
+    status_cache.publish(status, activate=True)
+
+    if memory_budget_mb is None:
+        memory_budget_mb = settings.PIPELINE_MEMORY_BUDGET_MB
+
+    threading.Thread(
+        target=run_pipeline,
+        args=(project_id, dataset_path, resume, memory_budget_mb),
+        daemon=True,
+    ).start()
+    return {"message": f"Processing started for {project_id}"}
+
+def preview_project(project_id: str, sample_size: int = None):
+    """Synchronous sampled preview; leaves status, results and Cloudinary alone."""
+    import yaml
+
+    dataset_path = PROJECT_PATH_MAP.get(project_id)
+    if not dataset_path:
+        return {"error": "Invalid project_id"}
+
+    if sample_size is None:
+        sample_size = settings.PREVIEW_SAMPLE_SIZE
+    if sample_size <= 0:
+        return {"error": "sample_size must be positive"}
+    sample_size = min(sample_size, settings.PREVIEW_MAX_SAMPLE_SIZE)
+
+    yaml_path = os.path.join(dataset_path, "data.yaml")
+    if not os.path.exists(yaml_path):
+        return {"error": f"Missing data.yaml in {dataset_path}"}
+
+    with open(yaml_path, "r") as f:
+        class_names = yaml.safe_load(f)["names"]
+
+    # A preview renders on this request's thread, so it takes a pipeline slot
+    # like a run does; when none is free it is refused rather than left waiting
+    if not PIPELINE_SLOTS.acquire(blocking=False):
+        return {"error": "All processing slots are busy, retry the preview shortly"}
+    try:
+        return run_preview(
+            project_id, dataset_path, class_names, sample_size,
+            os.path.join(PREVIEW_DIR, project_id),
+            lambda img_name: f"/api/processing/preview/{project_id}/{img_name}",
+        )
+    finally:
+        PIPELINE_SLOTS.release()
+
+_analytics_flight = SingleFlight()
+
+@processing_router.post("/start-processing", tags=["Project Processing"])
+@rate_limited("processing_control")
+def start_processing(request, data: StartProcessRequest):
+    if data.preview:
+        return preview_project(data.project_id, data.sample_size)
+    return start_project(data.project_id, data.resume, data.memory_budget_mb)
+
+@processing_router.get("/preview/{project_id}/{image_name}", tags=["Project Processing"])
+def preview_image(request, project_id: str, image_name: str):
+    path = os.path.join(PREVIEW_DIR, project_id, image_name)
+    if (project_id not in PROJECT_PATH_MAP or os.path.basename(image_name) != image_name
+            or not os.path.isfile(path)):
+        return {"error": "Preview image not found"}
+    return FileResponse(open(path, "rb"))
+
+@processing_router.post("/cancel-processing", tags=["Project Processing"])
+@rate_limited("processing_control")
+def cancel_processing(request, data: CancelProcessRequest):
+    with _running_lock:
+        if data.project_id not in _running_projects:
+            return {"error": f"{data.project_id} is not processing"}
+        _cancel_events.setdefault(data.project_id, threading.Event()).set()
+
+    return {"message": f"Cancellation requested for {data.project_id}"}
+
+@processing_router.get("/project-status", tags=["Project Processing"])
+@rate_limited("processing")
+def project_status(request, project_id: str = None):
+    return [s.to_dict() for s in status_cache.all_statuses(project_id)]
 
 @processing_router.get("/get-result", tags=["Project Processing"])
-def get_result(request):
-    status = ProjectStatus.objects.filter(active=True).first()
+@rate_limited("processing")
+def get_result(request, project_id: str = None):
+    status = status_cache.get_status(project_id)
     if not status:
         return {"processing": False, "images": []}
 
     if status.running:
-        return {"processing": True, "images": []}
+        return {"processing": True, "images": [], "status": status.to_dict()}
 
     path = os.path.join(settings.BASE_DIR, f"result_{status.project_id}.json")
-    return safe_load_json(path, {"processing": False, "images": []})
-
-@processing_router.get("/get-analytics", tags=["Project Processing"])
-def get_analytics(request):
-    import os
+    return json_file_response(request, path, {"processing": False, "images": []})
 
-    status = ProjectStatus.objects.filter(active=True).first()
-    if not status:
-        return {"barData": [], "pieData": [], "areaData": [], "lineData": []}
-
-    path = os.path.join(settings.BASE_DIR, f"analytics_{status.project_id}.json")
+def build_analytics_payload(path: str) -> bytes:
+    """Turn analytics_<project>.json into the dashboard chart JSON."""
     data = safe_load_json(path, {})
 
     # ----------------------------
@@ -306,12 +642,170 @@ def get_analytics(request):
         {"name": "Run 5", "Detections": 400, "Confidence": 94},
     ]
 
-    return {
+    return json.dumps({
         "barData": barData,
         "pieData": pieData,
         "areaData": areaData,
         "lineData": lineData
-    }
+    }).encode("utf-8")
+
+@processing_router.get("/get-analytics", tags=["Project Processing"])
+@rate_limited("processing")
+def get_analytics(request, project_id: str = None):
+    status = status_cache.get_status(project_id)
+    if not status:
+        return {"barData": [], "pieData": [], "areaData": [], "lineData": []}
+
+    path = os.path.join(settings.BASE_DIR, f"analytics_{status.project_id}.json")
+
+    # Chart data is derived only from the analytics file, so its stat
+    # doubles as the validator for the transformed response.
+    try:
+        stat = os.stat(path)
+    except OSError:
+        stat = None
+
+    if stat is not None:
+        not_modified = not_modified_response(request, stat)
+        if not_modified is not None:
+            return not_modified
+
+    # Concurrent polls of the same file version share one parse/build
+    key = (path, stat.st_mtime_ns, stat.st_size) if stat is not None else (path, None, None)
+    with tracing.span("analytics.build"):
+        payload = _analytics_flight.do(key, lambda: build_analytics_payload(path))
+
+    return encoded_json_response(request, payload, stat)
+
+
+# =====================================================
+# DATASET UPLOAD APIs (CHUNKED / RESUMABLE)
+# =====================================================
+@processing_router.post("/upload/init", tags=["Dataset Upload"])
+def upload_init(request, data: UploadInitRequest):
+    if data.project_id in PROJECT_PATH_MAP:
+        return {"error": f"project_id already exists: {data.project_id}"}
+
+    try:
+        return create_upload(
+            UPLOAD_DIR, data.project_id, data.filename,
+            data.total_size, data.sha256, settings.DATASET_UPLOAD_CHUNK_SIZE,
+        )
+    except UploadError as e:
+        return {"error": str(e)}
+
+@processing_router.get("/upload/{upload_id}", tags=["Dataset Upload"])
+def upload_status(request, upload_id: str):
+    try:
+        return get_upload(UPLOAD_DIR, upload_id)
+    except UploadError as e:
+        return {"error": str(e)}
+
+@processing_router.post("/upload/{upload_id}/chunk", tags=["Dataset Upload"])
+def upload_chunk(request, upload_id: str, offset: int,
+                 chunk_sha256: str = None, file: UploadedFile = File(...)):
+    try:
+        return write_chunk(UPLOAD_DIR, upload_id, offset, file.chunks(), chunk_sha256)
+    except UploadError as e:
+        return {"error": str(e)}
+
+@processing_router.post("/upload/{upload_id}/complete", tags=["Dataset Upload"])
+def upload_complete(request, upload_id: str, data: UploadCompleteRequest):
+    # Hashing and extracting a large archive runs in the background; poll
+    # GET /upload/{upload_id} until status is "completed" or "failed"
+    def on_ready(manifest):
+        try:
+            register_dataset(manifest["project_id"], manifest["dataset_path"])
+            if data.auto_start:
+                manifest["processing"] = start_project(manifest["project_id"])
+        finally:
+            connection.close()
+
+    try:
+        return start_finalize(UPLOAD_DIR, upload_id, BASE_DATASET_DIR,
+                              settings.DATASET_UPLOAD_MAX_EXTRACTED_BYTES, on_ready)
+    except UploadError as e:
+        return {"error": str(e)}
+
+
+# =====================================================
+# EXPORT APIs (STREAMING ZIP / TAR)
+# =====================================================
+def _export_members(project_id: str):
+    """Annotated images plus result and analytics JSON for ``project_id``,
+    or an error message."""
+    dataset_path = PROJECT_PATH_MAP.get(project_id)
+    if not dataset_path:
+        return None, f"Invalid project_id: {project_id}"
+
+    status = status_cache.get_status(project_id)
+    if status and status.running:
+        return None, "Processing is still running"
+
+    result_path = os.path.join(settings.BASE_DIR, f"result_{project_id}.json")
+    if not os.path.exists(result_path):
+        return None, "No results to export"
+
+    entries = [
+        (f"result_{project_id}.json", result_path),
+        (f"analytics_{project_id}.json", os.path.join(settings.BASE_DIR, f"analytics_{project_id}.json")),
+    ]
+    images_dir = os.path.join(dataset_path, "train", "images")
+    if os.path.isdir(images_dir):
+        entries += [
+            (f"images/{img_name}", os.path.join(OUTPUT_DIR, f"{project_id}_{img_name}"))
+            for img_name in scan_images(images_dir)
+        ]
+    return collect_members(entries), None
+
+@processing_router.get("/export", tags=["Export"])
+def export_results(request, project_id: str, format: str = "zip"):
+    members, error = _export_members(project_id)
+    if error:
+        return {"error": error}
+
+    try:
+        stream = archive_stream(format, members)
+    except ExportError as e:
+        return {"error": str(e)}
+    return stream_response(request, stream, f"{project_id}.{format}")
+
+@processing_router.post("/export", tags=["Export"])
+def export_results_background(request, data: ExportRequest):
+    members, error = _export_members(data.project_id)
+    if error:
+        return {"error": error}
+
+    def on_ready(export_id):
+        link = f"{settings.EXPORT_LINK_BASE_URL.rstrip('/')}/api/processing/export/download/{export_id}"
+        try:
+            send_download_link_email(data.email, link)
+        except Exception as e:
+            print("Export email failed:", e)
+
+    prune_exports(EXPORT_DIR, settings.EXPORT_TTL_HOURS * 3600)
+    try:
+        export_id = start_background_export(EXPORT_DIR, data.format, members, on_ready)
+    except ExportError as e:
+        return {"error": str(e)}
+
+    return {"message": f"Export started; the download link will be emailed to {data.email}",
+            "export_id": export_id}
+
+@processing_router.get("/export/download/{export_id}", tags=["Export"])
+def export_download(request, export_id: str):
+    prune_exports(EXPORT_DIR, settings.EXPORT_TTL_HOURS * 3600)
+
+    path = export_path(EXPORT_DIR, export_id)
+    if not path:
+        return {"error": "Export not found or not ready yet"}
+
+    fmt = os.path.splitext(path)[1].lstrip(".")
+    try:
+        stream = file_stream(path, EXPORT_FORMATS[fmt])
+    except ExportError as e:
+        return {"error": str(e)}
+    return stream_response(request, stream, f"export.{fmt}")
 
 
 # =====================================================
@@ -320,32 +814,32 @@ def get_analytics(request):
 
 @processing_router.get("/get-alerts", tags=["Static Data"])
 def get_alerts(request):
-    return safe_load_json(ALERTS_FILE, [])
+    return json_file_response(request, ALERTS_FILE, [])
 
 @processing_router.get("/get-projects", tags=["Static Data"])
 def get_projects(request):
-    return safe_load_json(PROJECTS_FILE, [])
+    return json_file_response(request, PROJECTS_FILE, [])
 
 @processing_router.get("/user-management", tags=["Static Data"])
 def user_management(request):
-    return safe_load_json(USER_MANAGEMENT, {})
+    return json_file_response(request, USER_MANAGEMENT, {})
 
 @processing_router.get("/admin-management", tags=["Static Data"])
 def admin_management(request):
-    return safe_load_json(ADMIN_MANAGEMENT, {})
+    return json_file_response(request, ADMIN_MANAGEMENT, {})
 
 @processing_router.get("/dashboard-data", tags=["Static Data"])
 def dashboard_data(request):
-    return safe_load_json(DASHBOARD_DATA, {})
+    return json_file_response(request, DASHBOARD_DATA, {})
 
 @processing_router.get("/client-data", tags=["Static Data"])
 def client_data(request):
-    return safe_load_json(CLIENT_DATA, [])
+    return json_file_response(request, CLIENT_DATA, [])
 
 @processing_router.get("/industries", tags=["Static Data"])
 def industries(request):
-    return safe_load_json(INDUSTRIES, [])
+    return json_file_response(request, INDUSTRIES, [])
 
 @processing_router.get("/recent-projects", tags=["Static Data"])
 def recent_projects(request):
-    return safe_load_json(RECENT_PROJECTS, [])
+    return json_file_response(request, RECENT_PROJECTS, [])
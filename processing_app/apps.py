@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """WAL lets status polls read while a pipeline thread writes."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=WAL;")
+        cursor.execute("PRAGMA synchronous=NORMAL;")
 
 
 class ProcessingAppConfig(AppConfig):
     name = 'processing_app'
+
+    def ready(self):
+        connection_created.connect(configure_sqlite, dispatch_uid="processing_app.sqlite_wal")
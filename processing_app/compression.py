@@ -0,0 +1,224 @@
+import os
+import gzip
+import shutil
+import tempfile
+
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.http import http_date, parse_http_date_safe
+
+from aip_project.throttling import SingleFlight
+from aip_project.tracing import span
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# =========================
+# CONFIG
+# =========================
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_read_flight = SingleFlight()
+_rebuild_flight = SingleFlight()
+
+# Preferred order when the client accepts several encodings
+ENCODINGS = (
+    ("br", ".br"),
+    ("gzip", ".gz"),
+)
+
+
+def _compress(encoding: str, payload: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(payload, quality=BROTLI_QUALITY)
+    return gzip.compress(payload, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _available_encodings():
+    for encoding, suffix in ENCODINGS:
+        if encoding == "br" and brotli is None:
+            continue
+        yield encoding, suffix
+
+
+# =========================
+# WRITE VARIANTS
+# =========================
+
+def write_compressed_variants(path: str):
+    """Store .gz (and .br when brotli is installed) copies next to ``path``.
+
+    Variants carry the source mtime so a stale copy is easy to spot. The
+    source is streamed, so large result files are never held in memory.
+    Each writer uses its own temp file, so concurrent rebuilds can't
+    interleave bytes in one variant.
+    """
+    tmp = None
+    try:
+        stat = os.stat(path)
+
+        for encoding, suffix in _available_encodings():
+            variant = path + suffix
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(variant) or ".",
+                                       prefix=os.path.basename(variant) + ".", suffix=".tmp")
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                if encoding == "br":
+                    compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+                    for block in iter(lambda: src.read(COPY_BUFFER_SIZE), b""):
+                        dst.write(compressor.process(block))
+                    dst.write(compressor.finish())
+                else:
+                    with gzip.GzipFile(fileobj=dst, mode="wb",
+                                       compresslevel=GZIP_LEVEL, mtime=0) as gz:
+                        shutil.copyfileobj(src, gz, COPY_BUFFER_SIZE)
+            os.chmod(tmp, 0o644)
+            os.utime(tmp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            os.replace(tmp, variant)
+            tmp = None
+    except Exception as e:
+        print("Compression error:", path, e)
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _fresh_variant(path: str, suffix: str, stat) -> bool:
+    try:
+        return os.stat(path + suffix).st_mtime_ns == stat.st_mtime_ns
+    except OSError:
+        return False
+
+
+# =========================
+# CONDITIONAL REQUESTS
+# =========================
+
+def make_etag(stat, encoding: str = None) -> str:
+    """Strong validator for one representation: each content coding of the
+    same file gets its own tag, as the bytes differ."""
+    coding = f"-{encoding}" if encoding else ""
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{coding}"'
+
+
+def _accepted_encodings(request) -> set:
+    accepted = set()
+    for part in request.headers.get("Accept-Encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if token and quality > 0:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def _negotiate(request):
+    """(encoding, suffix) this client will be sent, or (None, None)."""
+    accepted = _accepted_encodings(request)
+    for encoding, suffix in _available_encodings():
+        if encoding in accepted:
+            return encoding, suffix
+    return None, None
+
+
+def _is_not_modified(request, etag: str, last_modified: int) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return since is not None and int(last_modified) <= since
+
+
+def _set_cache_headers(response, etag: str, last_modified: int):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "no-cache"
+    response["Vary"] = "Accept-Encoding"
+    return response
+
+
+def _not_modified(request, stat, encoding):
+    etag = make_etag(stat, encoding)
+    if _is_not_modified(request, etag, stat.st_mtime):
+        return _set_cache_headers(HttpResponseNotModified(), etag, stat.st_mtime)
+    return None
+
+
+def not_modified_response(request, stat):
+    """Return a 304 for ``stat`` when the client copy (in the coding it
+    would be sent now) is current, else None."""
+    return _not_modified(request, stat, _negotiate(request)[0])
+
+
+def encoded_json_response(request, payload: bytes, stat=None):
+    """Compress an in-memory JSON body for the client, tagged with ``stat``."""
+    response = HttpResponse(content_type="application/json")
+
+    encoding, _ = _negotiate(request)
+    if encoding:
+        payload = _compress(encoding, payload)
+        response["Content-Encoding"] = encoding
+
+    response.content = payload
+    if stat is not None:
+        _set_cache_headers(response, make_etag(stat, encoding), stat.st_mtime)
+    else:
+        response["Vary"] = "Accept-Encoding"
+    return response
+
+
+# =========================
+# SERVE JSON FILE
+# =========================
+
+def json_file_response(request, path: str, default):
+    """Serve a JSON file from disk using its pre-compressed variant if possible.
+
+    Missing or stale variants (e.g. hand-edited static files) are rebuilt on
+    first use so later requests only read the compressed bytes.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return JsonResponse(default, safe=False)
+
+    encoding, source = None, path
+
+    candidate, suffix = _negotiate(request)
+    if candidate:
+        if not _fresh_variant(path, suffix, stat):
+            # Concurrent requests for a stale file share one rebuild
+            _rebuild_flight.do((path, stat.st_mtime_ns, stat.st_size),
+                               lambda: write_compressed_variants(path))
+        if _fresh_variant(path, suffix, stat):
+            encoding, source = candidate, path + suffix
+
+    not_modified = _not_modified(request, stat, encoding)
+    if not_modified is not None:
+        return not_modified
+
+    def _read():
+        with span("file.load", path=source), open(source, "rb") as f:
+            return f.read()
+
+    try:
+        # Concurrent requests for the same file version share one read
+        payload = _read_flight.do((source, stat.st_mtime_ns, stat.st_size), _read)
+    except OSError as e:
+        print("JSON serve error:", source, e)
+        return JsonResponse(default, safe=False)
+
+    response = HttpResponse(payload, content_type="application/json")
+    if encoding:
+        response["Content-Encoding"] = encoding
+    return _set_cache_headers(response, make_etag(stat, encoding), stat.st_mtime)
@@ -0,0 +1,321 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import hashlib
+import zipfile
+import threading
+
+# =========================
+# CONFIG
+# =========================
+
+COPY_BUFFER_SIZE = 1024 * 1024
+PROJECT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,100}$")
+
+_upload_locks = {}
+_locks_guard = threading.Lock()
+
+# Uploads whose archive is being verified/extracted on a background thread
+_finalizing = set()
+
+
+class UploadError(Exception):
+    pass
+
+
+def _lock_for(upload_id: str) -> threading.Lock:
+    with _locks_guard:
+        return _upload_locks.setdefault(upload_id, threading.Lock())
+
+
+def _upload_dir(upload_root: str, upload_id: str) -> str:
+    if not re.fullmatch(r"[0-9a-f]{32}", upload_id or ""):
+        raise UploadError("Invalid upload_id")
+    return os.path.join(upload_root, upload_id)
+
+
+def _manifest_path(upload_root: str, upload_id: str) -> str:
+    return os.path.join(_upload_dir(upload_root, upload_id), "manifest.json")
+
+
+def _data_path(upload_root: str, upload_id: str) -> str:
+    return os.path.join(_upload_dir(upload_root, upload_id), "data.zip.part")
+
+
+def _write_manifest(upload_root: str, manifest: dict):
+    path = _manifest_path(upload_root, manifest["upload_id"])
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# =========================
+# UPLOAD SESSION
+# =========================
+
+def create_upload(upload_root: str, project_id: str, filename: str,
+                  total_size: int, sha256: str, chunk_size: int) -> dict:
+    if not PROJECT_ID_RE.match(project_id):
+        raise UploadError("project_id may only contain letters, digits, '_' and '-'")
+    if total_size <= 0:
+        raise UploadError("total_size must be positive")
+    if not re.fullmatch(r"[0-9a-fA-F]{64}", sha256 or ""):
+        raise UploadError("sha256 must be a hex SHA-256 digest")
+
+    upload_id = uuid.uuid4().hex
+    os.makedirs(_upload_dir(upload_root, upload_id))
+    open(_data_path(upload_root, upload_id), "wb").close()
+
+    manifest = {
+        "upload_id": upload_id,
+        "project_id": project_id,
+        "filename": filename,
+        "total_size": total_size,
+        "sha256": sha256.lower(),
+        "chunk_size": chunk_size,
+        "status": "uploading",
+        "completed": False,
+    }
+    _write_manifest(upload_root, manifest)
+    return get_upload(upload_root, upload_id)
+
+
+def get_upload(upload_root: str, upload_id: str) -> dict:
+    path = _manifest_path(upload_root, upload_id)
+    if not os.path.exists(path):
+        raise UploadError("Unknown upload_id")
+
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+
+    manifest.setdefault("status", "completed" if manifest["completed"] else "uploading")
+
+    # The partial file on disk is the source of truth for resuming
+    if manifest["completed"]:
+        manifest["received_bytes"] = manifest["total_size"]
+    else:
+        manifest["received_bytes"] = os.path.getsize(_data_path(upload_root, upload_id))
+    return manifest
+
+
+def write_chunk(upload_root: str, upload_id: str, offset: int, chunks,
+                chunk_sha256: str = None) -> dict:
+    """Append one chunk at ``offset``, streaming ``chunks`` straight to disk.
+
+    Re-sending a chunk that was already (partly) received is allowed so a
+    client can resume after a dropped connection.
+    """
+    with _lock_for(upload_id):
+        manifest = get_upload(upload_root, upload_id)
+        if manifest["completed"]:
+            raise UploadError("Upload already completed")
+        if manifest["status"] == "finalizing":
+            raise UploadError("Upload is being finalized")
+
+        received = manifest["received_bytes"]
+        if offset < 0 or offset > received:
+            raise UploadError(f"Chunk offset {offset} does not match received bytes {received}")
+
+        data_path = _data_path(upload_root, upload_id)
+        digest = hashlib.sha256()
+        written = 0
+
+        with open(data_path, "r+b") as f:
+            f.seek(offset)
+            for block in chunks:
+                if offset + written + len(block) > manifest["total_size"]:
+                    f.truncate(offset)
+                    raise UploadError("Chunk exceeds declared total_size")
+                digest.update(block)
+                f.write(block)
+                written += len(block)
+
+            if chunk_sha256 and digest.hexdigest() != chunk_sha256.lower():
+                f.truncate(offset)
+                raise UploadError("Chunk checksum mismatch")
+
+            f.truncate(offset + written)
+
+        return get_upload(upload_root, upload_id)
+
+
+# =========================
+# FINALIZE / EXTRACT
+# =========================
+
+def _find_dataset_root(extract_dir: str) -> str:
+    if os.path.exists(os.path.join(extract_dir, "data.yaml")):
+        return extract_dir
+
+    entries = [e for e in os.listdir(extract_dir) if not e.startswith(("__MACOSX", "."))]
+    if len(entries) == 1:
+        nested = os.path.join(extract_dir, entries[0])
+        if os.path.exists(os.path.join(nested, "data.yaml")):
+            return nested
+
+    raise UploadError("Archive does not contain a YOLO data.yaml")
+
+
+def _extract_zip(archive_path: str, extract_dir: str):
+    root = os.path.realpath(extract_dir)
+
+    with zipfile.ZipFile(archive_path) as zf:
+        for member in zf.infolist():
+            target = os.path.realpath(os.path.join(root, member.filename))
+            if target != root and not target.startswith(root + os.sep):
+                raise UploadError(f"Unsafe path in archive: {member.filename}")
+
+            if member.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with zf.open(member) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+
+
+def _check_extracted_size(zf: zipfile.ZipFile, extract_dir: str, datasets_dir: str,
+                          max_bytes: int):
+    """Refuse archives that would unpack past ``max_bytes`` (0 = no limit)
+    or past the free space where they are extracted and moved to."""
+    size = sum(member.file_size for member in zf.infolist())
+    if max_bytes and size > max_bytes:
+        raise UploadError(f"Archive expands to {size} bytes, over the {max_bytes} byte limit")
+
+    for path in {os.path.dirname(extract_dir), datasets_dir}:
+        free = shutil.disk_usage(path).free
+        if size > free:
+            raise UploadError(f"Archive expands to {size} bytes but only {free} are free")
+
+
+def finalize_upload(upload_root: str, upload_id: str, datasets_dir: str,
+                    max_extracted_bytes: int = 0, on_ready=None) -> dict:
+    """Verify the assembled archive and extract it into ``datasets_dir``.
+
+    ``on_ready(manifest)`` runs once the dataset is in place, before the
+    manifest is marked completed, and may add fields to it. Returns the
+    manifest with ``dataset_path`` set.
+    """
+    with _lock_for(upload_id):
+        manifest = get_upload(upload_root, upload_id)
+        if manifest["completed"]:
+            return manifest
+
+        if manifest["received_bytes"] != manifest["total_size"]:
+            raise UploadError(
+                f"Upload incomplete: {manifest['received_bytes']}/{manifest['total_size']} bytes"
+            )
+
+        data_path = _data_path(upload_root, upload_id)
+        if file_sha256(data_path) != manifest["sha256"]:
+            raise UploadError("Archive checksum mismatch")
+
+        if not zipfile.is_zipfile(data_path):
+            raise UploadError("Uploaded file is not a zip archive")
+
+        dataset_path = os.path.join(datasets_dir, manifest["project_id"])
+        if os.path.exists(dataset_path):
+            raise UploadError(f"Dataset already exists: {manifest['project_id']}")
+
+        extract_dir = os.path.join(_upload_dir(upload_root, upload_id), "extract")
+        shutil.rmtree(extract_dir, ignore_errors=True)
+
+        try:
+            with zipfile.ZipFile(data_path) as zf:
+                _check_extracted_size(zf, extract_dir, datasets_dir, max_extracted_bytes)
+            _extract_zip(data_path, extract_dir)
+            dataset_root = _find_dataset_root(extract_dir)
+            if not os.path.isdir(os.path.join(dataset_root, "train", "images")):
+                raise UploadError("Archive is missing train/images")
+            shutil.move(dataset_root, dataset_path)
+        except zipfile.BadZipFile as e:
+            raise UploadError(f"Corrupt zip archive: {e}")
+        finally:
+            shutil.rmtree(extract_dir, ignore_errors=True)
+
+        os.remove(data_path)
+
+        manifest.pop("received_bytes", None)
+        manifest["dataset_path"] = dataset_path
+        if on_ready is not None:
+            on_ready(manifest)
+        manifest["completed"] = True
+        manifest["status"] = "completed"
+        manifest.pop("error", None)
+        _write_manifest(upload_root, manifest)
+        return get_upload(upload_root, upload_id)
+
+
+def _set_status(upload_root: str, upload_id: str, status: str, error: str = None):
+    manifest = get_upload(upload_root, upload_id)
+    manifest.pop("received_bytes", None)
+    manifest["status"] = status
+    manifest.pop("error", None)
+    if error:
+        manifest["error"] = error
+    _write_manifest(upload_root, manifest)
+    return get_upload(upload_root, upload_id)
+
+
+def start_finalize(upload_root: str, upload_id: str, datasets_dir: str,
+                   max_extracted_bytes: int = 0, on_ready=None) -> dict:
+    """Run finalize_upload on a background thread.
+
+    Returns the manifest at once with ``status`` "finalizing"; clients poll
+    get_upload until it is "completed" or "failed" (with ``error``). Calling
+    again after a failure, or after a restart interrupted finalizing, retries.
+    """
+    lock = _lock_for(upload_id)
+    with _locks_guard:
+        if upload_id in _finalizing:
+            return get_upload(upload_root, upload_id)
+        _finalizing.add(upload_id)
+
+    started = False
+    try:
+        with lock:
+            manifest = get_upload(upload_root, upload_id)
+            if manifest["completed"]:
+                return manifest
+            if manifest["received_bytes"] != manifest["total_size"]:
+                raise UploadError(
+                    f"Upload incomplete: {manifest['received_bytes']}/{manifest['total_size']} bytes"
+                )
+            manifest = _set_status(upload_root, upload_id, "finalizing")
+            started = True
+    finally:
+        if not started:
+            with _locks_guard:
+                _finalizing.discard(upload_id)
+
+    def _run():
+        error = None
+        try:
+            finalize_upload(upload_root, upload_id, datasets_dir, max_extracted_bytes, on_ready)
+        except Exception as e:
+            if not isinstance(e, UploadError):
+                print("Dataset finalize failed:", e)
+            error = str(e)
+
+        # Publish the outcome and allow a retry in one step, so a client
+        # that sees "failed" can call complete again straight away
+        with _locks_guard:
+            try:
+                if error is not None:
+                    _set_status(upload_root, upload_id, "failed", error)
+            finally:
+                _finalizing.discard(upload_id)
+
+    threading.Thread(target=_run, daemon=True).start()
+    return manifest
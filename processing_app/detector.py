@@ -0,0 +1,177 @@
+import os
+import threading
+
+from django.conf import settings
+
+# =========================
+# YOLO (ONNX) VIA cv2.dnn
+# =========================
+
+class YoloDetector:
+    """CPU YOLO inference through OpenCV's DNN module.
+
+    Accepts YOLOv5-style ``(N, anchors, 5 + nc)`` and YOLOv8+/v12-style
+    ``(N, 4 + nc, anchors)`` outputs. Detections come back in the YOLO label
+    format the pipeline already reads from ``train/labels``:
+    ``(class_id, x_center, y_center, width, height)`` normalised to 0..1.
+    """
+
+    def __init__(self, model_path: str, input_size: int = 640,
+                 conf_threshold: float = 0.25, nms_threshold: float = 0.45,
+                 threads: int = 0):
+        import cv2
+
+        if threads:
+            cv2.setNumThreads(threads)
+
+        self.net = cv2.dnn.readNetFromONNX(model_path)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+
+        self.input_size = input_size
+        self.conf_threshold = conf_threshold
+        self.nms_threshold = nms_threshold
+
+        # cv2.dnn.Net is not safe for concurrent forward() calls
+        self._lock = threading.Lock()
+
+    def detect_batch(self, frames):
+        """Run one forward pass over ``frames`` (BGR images)."""
+        import cv2
+        import numpy as np
+
+        if not frames:
+            return []
+
+        blob = cv2.dnn.blobFromImages(
+            frames, 1 / 255.0, (self.input_size, self.input_size),
+            swapRB=True, crop=False,
+        )
+        with self._lock:
+            self.net.setInput(blob)
+            output = self.net.forward()
+
+        output = np.asarray(output)
+        if output.ndim == 2:
+            output = output[np.newaxis]
+
+        return [self._parse(pred) for pred in output]
+
+    def _parse(self, pred):
+        import cv2
+        import numpy as np
+
+        # v8+ heads are (4 + nc, anchors); v5 heads are (anchors, 5 + nc)
+        if pred.shape[0] < pred.shape[1]:
+            pred = pred.T
+            boxes, scores = pred[:, :4], pred[:, 4:]
+        else:
+            boxes, scores = pred[:, :4], pred[:, 5:] * pred[:, 4:5]
+
+        if scores.shape[1] == 0:
+            return []
+
+        class_ids = scores.argmax(axis=1)
+        confidences = scores[np.arange(len(scores)), class_ids]
+        keep = confidences >= self.conf_threshold
+        if not keep.any():
+            return []
+
+        boxes = boxes[keep] / float(self.input_size)
+        class_ids = class_ids[keep]
+        confidences = confidences[keep]
+
+        rects = [[float(x - w / 2), float(y - h / 2), float(w), float(h)] for x, y, w, h in boxes]
+        # Per-class NMS: overlapping objects of different classes both stay
+        indices = cv2.dnn.NMSBoxesBatched(rects, confidences.tolist(), class_ids.tolist(),
+                                          self.conf_threshold, self.nms_threshold)
+
+        detections = []
+        for i in np.array(indices).flatten():
+            x, y, w, h = boxes[i]
+            detections.append((int(class_ids[i]), float(x), float(y), float(w), float(h)))
+        return detections
+
+
+_detectors = {}
+_detectors_lock = threading.Lock()
+
+
+def get_detector():
+    """Return the configured detector, or None when inference is disabled."""
+    model_path = settings.PIPELINE_DETECTOR_MODEL
+    if not model_path:
+        return None
+
+    with _detectors_lock:
+        detector = _detectors.get(model_path)
+        if detector is None:
+            detector = YoloDetector(
+                model_path,
+                input_size=settings.PIPELINE_DETECTOR_INPUT_SIZE,
+                conf_threshold=settings.PIPELINE_DETECTOR_CONF,
+                nms_threshold=settings.PIPELINE_DETECTOR_NMS,
+                threads=settings.PIPELINE_DETECTOR_THREADS,
+            )
+            _detectors[model_path] = detector
+        return detector
+
+
+# =========================
+# PIPELINE STAGE
+# =========================
+
+def class_label(class_names, class_id: int) -> str:
+    try:
+        return class_names[class_id]
+    except (IndexError, KeyError):
+        return f"class_{class_id}"
+
+
+def read_label_file(label_path: str):
+    detections = []
+    with open(label_path, "r") as lf:
+        for line in lf:
+            parts = line.strip().split()
+            if len(parts) != 5:
+                continue
+            cls, x, y, bw, bh = map(float, parts)
+            detections.append((int(cls), x, y, bw, bh))
+    return detections
+
+
+def attach_detections(frames, label_path_for, detector=None, batch_size: int = 8):
+    """Yield ``(idx, name, frame, detections)`` in input order.
+
+    Labelled images use their ``.txt`` file, so their frame may be None
+    (left for a worker to decode). Unlabelled images are batched through
+    ``detector`` when one is configured, else they get no detections as
+    before. Up to ``batch_size`` frames are held while a batch fills.
+    """
+    pending = []
+    to_infer = []
+
+    def _flush():
+        if to_infer:
+            results = detector.detect_batch([pending[i][2] for i in to_infer])
+            for i, detections in zip(to_infer, results):
+                pending[i][3] = detections
+            to_infer.clear()
+        while pending:
+            yield tuple(pending.pop(0))
+
+    for idx, name, frame in frames:
+        detections = []
+        label_path = label_path_for(name)
+
+        if os.path.exists(label_path):
+            detections = read_label_file(label_path)
+        elif frame is not None and detector is not None:
+            to_infer.append(len(pending))
+
+        pending.append([idx, name, frame, detections])
+
+        if not to_infer or len(to_infer) >= batch_size:
+            yield from _flush()
+
+    yield from _flush()
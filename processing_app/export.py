@@ -0,0 +1,385 @@
+import os
+import re
+import time
+import zlib
+import struct
+import tarfile
+import hashlib
+import secrets
+import threading
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+
+# =========================
+# STREAMING ARCHIVE EXPORT
+# =========================
+# Archives are described as a list of segments (headers, file bodies,
+# padding, central directory) whose lengths are known before any byte is
+# produced. That gives an exact Content-Length up front, lets a Range request
+# start in the middle without generating what precedes it, and keeps memory
+# flat: file bodies are streamed from disk in COPY_BUFFER_SIZE chunks.
+#
+# ZIP members are stored (images are already compressed), with CRCs computed
+# from disk when their header is first needed, and zip64 records only when
+# sizes or offsets require them.
+
+COPY_BUFFER_SIZE = 1024 * 1024
+EXPORT_ID_RE = re.compile(r"^[A-Za-z0-9_-]{16,64}$")
+
+FORMATS = {
+    "zip": "application/zip",
+    "tar": "application/x-tar",
+}
+
+_ZIP32_LIMIT = 0xFFFFFFFF
+
+Member = namedtuple("Member", "arcname path size mtime")
+
+
+class ExportError(Exception):
+    pass
+
+
+def collect_members(entries):
+    """``(arcname, path)`` pairs -> Members, skipping files that don't exist."""
+    members = []
+    for arcname, path in entries:
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        members.append(Member(arcname, path, st.st_size, int(st.st_mtime)))
+    return members
+
+
+def _file_chunks(path: str, offset: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while length > 0:
+            chunk = f.read(min(COPY_BUFFER_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+    # The file shrank since it was listed; keep the advertised length
+    while length > 0:
+        pad = min(COPY_BUFFER_SIZE, length)
+        length -= pad
+        yield b"\0" * pad
+
+
+class _Segment:
+    """``length`` bytes produced by ``read(offset, length)`` on demand."""
+
+    def __init__(self, length: int, read):
+        self.length = length
+        self.read = read
+
+
+def _bytes_segment(data: bytes) -> _Segment:
+    return _Segment(len(data), lambda offset, length: iter([data[offset:offset + length]]))
+
+
+def _lazy_segment(length: int, build) -> _Segment:
+    def read(offset, n):
+        data = build()
+        assert len(data) == length
+        yield data[offset:offset + n]
+    return _Segment(length, read)
+
+
+def _file_segment(member: Member) -> _Segment:
+    return _Segment(member.size, lambda offset, length: _file_chunks(member.path, offset, length))
+
+
+class ArchiveStream:
+    """A byte stream of known size assembled from segments."""
+
+    def __init__(self, segments, etag: str, content_type: str):
+        self.segments = [s for s in segments if s.length]
+        self.size = sum(s.length for s in self.segments)
+        self.etag = etag
+        self.content_type = content_type
+
+    def iter_range(self, start: int = 0, end: int = None):
+        """Yield bytes ``start``..``end`` (inclusive)."""
+        end = self.size - 1 if end is None else end
+        position = 0
+        for segment in self.segments:
+            seg_start, seg_end = position, position + segment.length - 1
+            position += segment.length
+            if seg_end < start:
+                continue
+            if seg_start > end:
+                break
+            offset = max(start, seg_start) - seg_start
+            length = min(end, seg_end) - seg_start + 1 - offset
+            yield from segment.read(offset, length)
+
+
+def _members_etag(fmt: str, members) -> str:
+    digest = hashlib.sha1(fmt.encode())
+    for m in members:
+        digest.update(f"{m.arcname}\0{m.size}\0{m.mtime}\n".encode("utf-8"))
+    return f'"{digest.hexdigest()}"'
+
+
+# ---- tar ----
+
+def tar_stream(members) -> ArchiveStream:
+    segments = []
+    for m in members:
+        info = tarfile.TarInfo(m.arcname)
+        info.size = m.size
+        info.mtime = m.mtime
+        info.mode = 0o644
+        segments.append(_bytes_segment(info.tobuf(tarfile.PAX_FORMAT, "utf-8", "surrogateescape")))
+        segments.append(_file_segment(m))
+        segments.append(_bytes_segment(b"\0" * (-m.size % tarfile.BLOCKSIZE)))
+
+    # End-of-archive blocks, padded to a whole record like tarfile does
+    size = sum(s.length for s in segments) + 2 * tarfile.BLOCKSIZE
+    trailer = 2 * tarfile.BLOCKSIZE + (-size % tarfile.RECORDSIZE)
+    segments.append(_bytes_segment(b"\0" * trailer))
+
+    return ArchiveStream(segments, _members_etag("tar", members), FORMATS["tar"])
+
+
+# ---- zip ----
+
+def _dos_datetime(mtime: int):
+    t = time.localtime(max(mtime, 315532800))  # ZIP dates start at 1980
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _file_crc32(path: str, size: int) -> int:
+    crc = 0
+    for chunk in _file_chunks(path, 0, size):
+        crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def _zip_local_header(m: Member, crc: int) -> bytes:
+    name = m.arcname.encode("utf-8")
+    zip64 = m.size >= _ZIP32_LIMIT
+    extra = struct.pack("<HHQQ", 0x0001, 16, m.size, m.size) if zip64 else b""
+    size32 = _ZIP32_LIMIT if zip64 else m.size
+    dos_time, dos_date = _dos_datetime(m.mtime)
+    return struct.pack(
+        "<IHHHHHIIIHH", 0x04034B50, 45 if zip64 else 20, 0x800, 0,
+        dos_time, dos_date, crc, size32, size32, len(name), len(extra),
+    ) + name + extra
+
+
+def _zip_central_entry(m: Member, crc: int, offset: int) -> bytes:
+    name = m.arcname.encode("utf-8")
+    fields = []
+    if m.size >= _ZIP32_LIMIT:
+        fields += [m.size, m.size]
+    if offset >= _ZIP32_LIMIT:
+        fields.append(offset)
+    extra = struct.pack(f"<HH{len(fields)}Q", 0x0001, 8 * len(fields), *fields) if fields else b""
+
+    size32 = min(m.size, _ZIP32_LIMIT)
+    version = 45 if fields else 20
+    dos_time, dos_date = _dos_datetime(m.mtime)
+    return struct.pack(
+        "<IHHHHHHIIIHHHHHII", 0x02014B50, (3 << 8) | version, version, 0x800, 0,
+        dos_time, dos_date, crc, size32, size32, len(name), len(extra),
+        0, 0, 0, 0o100644 << 16, min(offset, _ZIP32_LIMIT),
+    ) + name + extra
+
+
+def _zip_end_records(count: int, cd_offset: int, cd_size: int) -> bytes:
+    records = b""
+    if count >= 0xFFFF or cd_offset >= _ZIP32_LIMIT or cd_size >= _ZIP32_LIMIT:
+        zip64_offset = cd_offset + cd_size
+        records += struct.pack(
+            "<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0,
+            count, count, cd_size, cd_offset,
+        )
+        records += struct.pack("<IIQI", 0x07064B50, 0, zip64_offset, 1)
+    records += struct.pack(
+        "<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+        min(cd_size, _ZIP32_LIMIT), min(cd_offset, _ZIP32_LIMIT), 0,
+    )
+    return records
+
+
+def zip_stream(members) -> ArchiveStream:
+    crcs = {}
+    crc_lock = threading.Lock()
+
+    def crc_of(i):
+        with crc_lock:
+            if i not in crcs:
+                crcs[i] = _file_crc32(members[i].path, members[i].size)
+            return crcs[i]
+
+    segments = []
+    offsets = []
+    position = 0
+    for i, m in enumerate(members):
+        offsets.append(position)
+        # Header lengths don't depend on the CRC, so size it with a placeholder
+        header_length = len(_zip_local_header(m, 0))
+        segments.append(_lazy_segment(header_length, lambda i=i, m=m: _zip_local_header(m, crc_of(i))))
+        segments.append(_file_segment(m))
+        position += header_length + m.size
+
+    cd_offset = position
+    cd_size = sum(len(_zip_central_entry(m, 0, offsets[i])) for i, m in enumerate(members))
+
+    def central_directory():
+        return b"".join(_zip_central_entry(m, crc_of(i), offsets[i]) for i, m in enumerate(members))
+
+    segments.append(_lazy_segment(cd_size, central_directory))
+    segments.append(_bytes_segment(_zip_end_records(len(members), cd_offset, cd_size)))
+
+    return ArchiveStream(segments, _members_etag("zip", members), FORMATS["zip"])
+
+
+def archive_stream(fmt: str, members) -> ArchiveStream:
+    if fmt not in FORMATS:
+        raise ExportError(f"Unsupported format: {fmt} (expected one of {', '.join(FORMATS)})")
+    return zip_stream(members) if fmt == "zip" else tar_stream(members)
+
+
+def file_stream(path: str, content_type: str) -> ArchiveStream:
+    member = collect_members([(os.path.basename(path), path)])
+    if not member:
+        raise ExportError("Export not found")
+    return ArchiveStream([_file_segment(member[0])], _members_etag("file", member), content_type)
+
+
+# =========================
+# HTTP (RANGE SUPPORT)
+# =========================
+
+def _parse_range(header: str, size: int):
+    """Single ``bytes=`` range -> (start, end) inclusive; None to serve the
+    whole stream; "invalid" when unsatisfiable."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(0, size - int(last)), size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        return "invalid"
+    return start, min(end, size - 1)
+
+
+async def _async_chunks(chunks):
+    """Serve a blocking chunk iterator to an ASGI server one chunk at a time.
+
+    Django materialises a sync iterator with ``sync_to_async(list)`` under
+    ASGI, which would build the whole archive in memory before sending.
+    """
+    done = object()
+    read = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            chunk = await read(chunks, done)
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=False)()
+
+
+def stream_response(request, stream: ArchiveStream, filename: str):
+    byte_range = _parse_range(request.headers.get("Range"), stream.size)
+
+    # A stale If-Range validator means the client's partial copy is of a
+    # different archive: send the whole current one instead
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != stream.etag:
+        byte_range = None
+
+    if byte_range == "invalid":
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stream.size}"
+        return response
+
+    if byte_range is None:
+        start, end, status = 0, stream.size - 1, 200
+    else:
+        (start, end), status = byte_range, 206
+
+    chunks = stream.iter_range(start, end) if stream.size else iter([b""])
+    if isinstance(request, ASGIRequest):
+        chunks = _async_chunks(chunks)
+
+    response = StreamingHttpResponse(chunks, content_type=stream.content_type, status=status)
+    response["Content-Length"] = str(end - start + 1 if stream.size else 0)
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = stream.etag
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    if status == 206:
+        response["Content-Range"] = f"bytes {start}-{end}/{stream.size}"
+    return response
+
+
+# =========================
+# BACKGROUND EXPORTS
+# =========================
+
+def export_path(export_dir: str, export_id: str):
+    """Path of a finished export, or None."""
+    if not EXPORT_ID_RE.match(export_id or ""):
+        return None
+    for fmt in FORMATS:
+        path = os.path.join(export_dir, f"{export_id}.{fmt}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def prune_exports(export_dir: str, max_age_seconds: float):
+    cutoff = time.time() - max_age_seconds
+    for entry in os.scandir(export_dir):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def start_background_export(export_dir: str, fmt: str, members, on_ready) -> str:
+    """Write the archive to ``export_dir`` on a thread, then call
+    ``on_ready(export_id)``. Returns the export id immediately."""
+    stream = archive_stream(fmt, members)
+    export_id = secrets.token_urlsafe(24)
+    final_path = os.path.join(export_dir, f"{export_id}.{fmt}")
+    part_path = final_path + ".part"
+
+    def _run():
+        try:
+            with open(part_path, "wb") as out:
+                for chunk in stream.iter_range():
+                    out.write(chunk)
+            os.replace(part_path, final_path)
+            on_ready(export_id)
+        except Exception as e:
+            print("Background export failed:", e)
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    threading.Thread(target=_run, daemon=True).start()
+    return export_id
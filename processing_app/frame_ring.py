@@ -0,0 +1,86 @@
+import os
+import queue
+import threading
+from multiprocessing import shared_memory
+
+# =========================
+# SHARED-MEMORY FRAME RING
+# =========================
+# Frames decoded in the pipeline process (prefetch / detector path) are
+# copied once into a slot of a shared-memory ring; worker processes get only
+# (segment, slot, shape, dtype) and map the slot as a NumPy array in place of
+# unpickling the whole frame.
+
+
+class FrameRing:
+    def __init__(self, slots: int, slot_bytes: int):
+        self.slots = max(1, slots)
+        self.slot_bytes = slot_bytes
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slots * slot_bytes)
+
+        # The segment is a sparse tmpfs file: without reserving its pages, the
+        # first frame written past /dev/shm's free space raises SIGBUS and kills
+        # the process. Reserve up front so a small /dev/shm (Docker defaults to
+        # 64 MB) is an OSError and the runner falls back to pickling.
+        try:
+            os.posix_fallocate(self._shm._fd, 0, self.slots * slot_bytes)
+        except OSError:
+            self.close()
+            raise
+
+        self._free = queue.Queue()
+        for slot in range(self.slots):
+            self._free.put(slot)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def put(self, job):
+        """Move ``job.frame`` into a free slot. Frames that don't fit, or
+        arrive while every slot is in flight, are left to be pickled."""
+        frame = job.frame
+        if frame is None or frame.nbytes > self.slot_bytes:
+            return job
+        try:
+            slot = self._free.get_nowait()
+        except queue.Empty:
+            return job
+
+        import numpy as np
+
+        offset = slot * self.slot_bytes
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._shm.buf, offset=offset)
+        view[...] = frame
+        del view
+
+        job.frame = None
+        job.shared = (self.name, slot, offset, frame.shape, frame.dtype.str)
+        return job
+
+    def release(self, job):
+        if job.shared is not None:
+            self._free.put(job.shared[1])
+            job.shared = None
+        return job
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+# Segments attached by this (worker) process, by name
+_attached = {}
+_attached_lock = threading.Lock()
+
+
+def frame_from_ring(shared):
+    """NumPy view of a ring slot described by ``job.shared``."""
+    import numpy as np
+
+    name, _, offset, shape, dtype = shared
+    with _attached_lock:
+        shm = _attached.get(name)
+        if shm is None:
+            shm = _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
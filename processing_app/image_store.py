@@ -0,0 +1,66 @@
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError
+
+from .models import ImageUpload
+
+
+_cloudinary_lock = threading.Lock()
+_cloudinary_ready = False
+
+
+def _uploader():
+    """Import and configure Cloudinary on first upload, not at app import."""
+    global _cloudinary_ready
+
+    import cloudinary
+    import cloudinary.uploader
+
+    with _cloudinary_lock:
+        if not _cloudinary_ready:
+            cloudinary.config(
+                cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+                api_key=os.getenv("CLOUDINARY_API_KEY"),
+                api_secret=os.getenv("CLOUDINARY_API_SECRET")
+            )
+            _cloudinary_ready = True
+    return cloudinary.uploader
+
+
+def upload_deduplicated(path: str, digest: str) -> str:
+    """Upload the encoded image at ``path`` unless identical bytes were
+    uploaded before; return its secure URL ("" on failure).
+
+    The public ID is derived from ``digest`` so re-uploads of the same
+    rendition land on the same Cloudinary asset instead of a new one.
+    """
+    url = ImageUpload.objects.filter(content_hash=digest).values_list("url", flat=True).first()
+    if url:
+        return url
+
+    public_id = f"{settings.CLOUDINARY_UPLOAD_FOLDER}/{digest}"
+    try:
+        upload = _uploader().upload(
+            path,
+            public_id=public_id,
+            overwrite=False,
+            unique_filename=False,
+            timeout=settings.PIPELINE_UPLOAD_TIMEOUT,
+        )
+    except Exception as e:
+        print("Upload error:", path, e)
+        return ""
+
+    url = upload.get("secure_url", "")
+    if url:
+        try:
+            ImageUpload.objects.get_or_create(
+                content_hash=digest,
+                defaults={"public_id": public_id, "url": url},
+            )
+        except IntegrityError:
+            # Another pipeline recorded the same rendition first
+            pass
+    return url
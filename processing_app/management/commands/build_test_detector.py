@@ -0,0 +1,67 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+DEFAULT_OUTPUT = os.path.join(settings.BASE_DIR, "processing_app", "testdata", "tiny_yolo.onnx")
+
+
+class Command(BaseCommand):
+    help = (
+        "Build a tiny YOLOv8-layout ONNX model for exercising the inference "
+        "stage offline. It ignores image content and always reports one box "
+        "covering the centre of the frame for class 0."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default=DEFAULT_OUTPUT)
+        parser.add_argument("--classes", type=int, default=1)
+        parser.add_argument("--input-size", type=int, default=640)
+
+    def handle(self, *args, **options):
+        try:
+            import numpy as np
+            import onnx
+            from onnx import TensorProto, helper, numpy_helper
+        except ImportError:
+            raise CommandError("The 'onnx' package is required: pip install onnx")
+
+        nc = options["classes"]
+        size = float(options["input_size"])
+        channels = 4 + nc
+        # Real heads have far more anchors than channels; the detector relies
+        # on that to tell the v8 layout apart from v5
+        anchors = max(16, channels + 1)
+
+        # GlobalAveragePool -> Flatten -> Gemm(W=0, bias=fixed boxes) -> Reshape
+        # gives a (N, 4 + nc, anchors) head where only anchor 0 scores
+        bias = np.zeros((channels, anchors), dtype=np.float32)
+        bias[:4, 0] = [size / 2, size / 2, size / 2, size / 2]
+        bias[4, 0] = 0.9
+
+        initializers = [
+            numpy_helper.from_array(np.zeros((3, channels * anchors), dtype=np.float32), "W"),
+            numpy_helper.from_array(bias.reshape(-1), "B"),
+            numpy_helper.from_array(np.array([-1, channels, anchors], dtype=np.int64), "shape"),
+        ]
+        nodes = [
+            helper.make_node("GlobalAveragePool", ["images"], ["pooled"]),
+            helper.make_node("Flatten", ["pooled"], ["flat"], axis=1),
+            helper.make_node("Gemm", ["flat", "W", "B"], ["head"]),
+            helper.make_node("Reshape", ["head", "shape"], ["output0"]),
+        ]
+        graph = helper.make_graph(
+            nodes,
+            "tiny_yolo",
+            [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["N", 3, "H", "W"])],
+            [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["N", channels, anchors])],
+            initializers,
+        )
+        model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+        model.ir_version = 8
+        onnx.checker.check_model(model)
+
+        os.makedirs(os.path.dirname(options["output"]), exist_ok=True)
+        onnx.save(model, options["output"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
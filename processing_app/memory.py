@@ -0,0 +1,204 @@
+import os
+import json
+import queue
+import resource
+import threading
+
+from .compression import write_compressed_variants
+
+# =========================
+# RSS TRACKING
+# =========================
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is the lifetime peak (KB on Linux), the best we can do here
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class MemoryTracker:
+    """Samples RSS during a job and remembers the peak it saw."""
+
+    # Start throttling prefetch once RSS passes this share of the budget
+    SOFT_LIMIT = 0.8
+
+    def __init__(self, budget_bytes: int = 0):
+        self.budget_bytes = budget_bytes
+        self.peak = 0
+        self.sample()
+
+    def sample(self) -> int:
+        rss = current_rss()
+        if rss > self.peak:
+            self.peak = rss
+        return rss
+
+    def under_pressure(self) -> bool:
+        if not self.budget_bytes:
+            return False
+        return self.sample() > self.budget_bytes * self.SOFT_LIMIT
+
+    @property
+    def peak_mb(self) -> float:
+        return round(self.peak / (1024 * 1024), 1)
+
+
+# =========================
+# STREAMING DIRECTORY SCAN
+# =========================
+
+def iter_image_names(images_dir: str, extensions):
+    """Yield image file names without materialising the directory listing."""
+    with os.scandir(images_dir) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(extensions) and entry.is_file():
+                yield entry.name
+
+
+# =========================
+# PREFETCH WITH BUFFER REUSE
+# =========================
+
+_DONE = object()
+
+
+def prefetch_frames(images_dir: str, indexed_names, depth: int, tracker: MemoryTracker):
+    """Yield ``(idx, name, frame)`` for ``(idx, name)`` pairs.
+
+    A reader thread loads encoded bytes ahead of the decoder into a small
+    pool of reusable buffers. ``depth`` bounds how far it may run ahead, and
+    it stops reading ahead altogether while ``tracker`` reports memory
+    pressure. ``frame`` is None for unreadable images, like ``cv2.imread``.
+    """
+    import cv2
+    import numpy as np
+
+    depth = max(1, depth)
+    ready = queue.Queue(maxsize=depth)
+    free = queue.Queue()
+    for _ in range(depth + 1):
+        free.put(bytearray())
+    stop = threading.Event()
+
+    def _put(item):
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _reader():
+        try:
+            for idx, name in indexed_names:
+                while tracker.under_pressure() and not ready.empty() and not stop.is_set():
+                    stop.wait(0.01)
+
+                buf = None
+                while buf is None and not stop.is_set():
+                    try:
+                        buf = free.get(timeout=0.1)
+                    except queue.Empty:
+                        continue
+                if buf is None:
+                    return
+
+                size = 0
+                try:
+                    path = os.path.join(images_dir, name)
+                    size = os.path.getsize(path)
+                    if len(buf) < size:
+                        buf = bytearray(size)
+                    with open(path, "rb") as f:
+                        size = f.readinto(memoryview(buf)[:size])
+                except OSError:
+                    size = 0
+
+                if not _put((idx, name, buf, size)):
+                    return
+        finally:
+            _put(_DONE)
+
+    reader = threading.Thread(target=_reader, daemon=True)
+    reader.start()
+
+    try:
+        while True:
+            item = ready.get()
+            if item is _DONE:
+                break
+
+            idx, name, buf, size = item
+            frame = None
+            if size:
+                encoded = np.frombuffer(buf, dtype=np.uint8, count=size)
+                frame = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+                del encoded
+            free.put(buf)
+            yield idx, name, frame
+    finally:
+        stop.set()
+        reader.join(timeout=1)
+
+
+# =========================
+# RESULT SPOOL
+# =========================
+
+class RecordSpool:
+    """Append-only JSON-lines spool that keeps at most ``batch_size``
+    result records in memory before flushing them to disk."""
+
+    def __init__(self, path: str, batch_size: int = 100):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self._pending = []
+
+    def truncate(self, size: int):
+        """Drop everything after byte ``size`` (used when resuming)."""
+        self._pending = []
+        with open(self.path, "ab") as f:
+            f.truncate(size)
+
+    def append(self, record: dict):
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> int:
+        if self._pending:
+            with open(self.path, "a", encoding="utf-8") as f:
+                for record in self._pending:
+                    f.write(json.dumps(record))
+                    f.write("\n")
+            self._pending = []
+        return os.path.getsize(self.path)
+
+    def __iter__(self):
+        self.flush()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def write_result(self, result_path: str, project_id: str):
+        """Stream the spooled records into the usual result JSON layout."""
+        tmp = result_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as out:
+            out.write('{"project_id": %s, "images": [' % json.dumps(project_id))
+            for i, record in enumerate(self):
+                if i:
+                    out.write(",")
+                out.write("\n")
+                out.write(json.dumps(record))
+            out.write("\n]}\n")
+        os.replace(tmp, result_path)
+        write_compressed_variants(result_path)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 19:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processing_app', '0004_projectstatus_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectstatus',
+            name='cancelled',
+            field=models.BooleanField(default=False),
+        ),
+    ]
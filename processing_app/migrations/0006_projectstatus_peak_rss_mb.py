@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-19 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processing_app', '0005_projectstatus_cancelled'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projectstatus',
+            name='peak_rss_mb',
+            field=models.FloatField(default=0),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 class ProjectStatus(models.Model):
     project_id = models.CharField(max_length=100, unique=True)
@@ -6,8 +7,63 @@ class ProjectStatus(models.Model):
     active = models.BooleanField(default=False)
     running = models.BooleanField(default=False)
     completed = models.BooleanField(default=False)
+    cancelled = models.BooleanField(default=False)
+
+    total_images = models.PositiveIntegerField(default=0)
+    processed_images = models.PositiveIntegerField(default=0)
+    peak_rss_mb = models.FloatField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
 
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.project_id
+
+    @property
+    def queued(self):
+        return self.running and self.started_at is None
+
+    @property
+    def elapsed_seconds(self):
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or timezone.now()
+        return max(0.0, (end - self.started_at).total_seconds())
+
+    @property
+    def throughput(self):
+        """Processed images per second for the current (or last) run."""
+        elapsed = self.elapsed_seconds
+        return round(self.processed_images / elapsed, 3) if elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            "project_id": self.project_id,
+            "active": self.active,
+            "queued": self.queued,
+            "running": self.running,
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "total_images": self.total_images,
+            "processed_images": self.processed_images,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "throughput": self.throughput,
+            "peak_rss_mb": self.peak_rss_mb,
+            "error": self.error,
+        }
+
+
+class ImageUpload(models.Model):
+    """Content hash -> Cloudinary URL for annotated images already uploaded."""
+    content_hash = models.CharField(max_length=64, unique=True)
+    public_id = models.CharField(max_length=255)
+    url = models.URLField(max_length=500)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.public_id
@@ -0,0 +1,233 @@
+import os
+import time
+import random
+import shutil
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .detector import attach_detections, class_label, get_detector, read_label_file
+from .stages import ImageJob, scan_images, label_path_for, process_image
+
+# =========================
+# SAMPLED PREVIEW
+# =========================
+# A preview renders a class-stratified sample of the dataset at low
+# resolution into a local folder (nothing is uploaded, no status or result
+# files are touched) and extrapolates the full run from it.
+
+UNLABELLED = "__unlabelled__"
+
+
+def _primary_class(labels_dir: str, name: str):
+    path = label_path_for(labels_dir, name)
+    if not os.path.exists(path):
+        return UNLABELLED
+    counts = Counter(int(d[0]) for d in read_label_file(path))
+    return counts.most_common(1)[0][0] if counts else UNLABELLED
+
+
+def stratified_sample(names, labels_dir: str, size: int, seed: str, pool: int = 0):
+    """Pick ``size`` names, stratified by each image's most frequent label
+    class. Only a random ``pool`` of the names (all when 0) has its label
+    file read. Returns (sample, strata) where strata maps class -> pooled names."""
+    rng = random.Random(seed)
+    if 0 < pool < len(names):
+        names = rng.sample(names, pool)
+
+    strata = defaultdict(list)
+    for name in names:
+        strata[_primary_class(labels_dir, name)].append(name)
+
+    total = sum(len(group) for group in strata.values())
+    size = min(size, total)
+
+    # Proportional allocation, at least one image per class while size allows
+    keys = sorted(strata, key=lambda k: (-len(strata[k]), str(k)))
+    alloc = {k: 0 for k in keys}
+    for k in keys[:size]:
+        alloc[k] = 1
+    remaining = size - sum(alloc.values())
+    if remaining > 0:
+        shares = {k: remaining * len(strata[k]) / total for k in keys}
+        for k in keys:
+            alloc[k] += min(int(shares[k]), len(strata[k]) - alloc[k])
+        for k in sorted(keys, key=lambda k: shares[k] - int(shares[k]), reverse=True):
+            if sum(alloc.values()) >= size:
+                break
+            if alloc[k] < len(strata[k]):
+                alloc[k] += 1
+
+    sample = []
+    for k in keys:
+        sample += [(k, name) for name in rng.sample(strata[k], alloc[k])]
+    return sample, strata
+
+
+def _reduced_flag(width: int, height: int, max_side: int):
+    """Largest libjpeg/libpng decode-time reduction keeping max_side pixels."""
+    import cv2
+
+    longest = max(width, height)
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                         (4, cv2.IMREAD_REDUCED_COLOR_4),
+                         (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if longest // factor >= max_side:
+            return flag
+    return cv2.IMREAD_COLOR
+
+
+def _downscale(frame, max_side: int):
+    import cv2
+
+    h, w = frame.shape[:2]
+    scale = max_side / max(h, w)
+    if scale >= 1:
+        return frame
+    return cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def _full_res_seconds(job: ImageJob) -> float:
+    """Time decode/labels/render/encode on one full-size image."""
+    start = time.perf_counter()
+    process_image(job)
+    return time.perf_counter() - start
+
+
+def run_preview(project_id: str, dataset_path: str, class_names, sample_size: int,
+                preview_dir: str, url_for):
+    import cv2
+
+    images_dir = os.path.join(dataset_path, "train", "images")
+    labels_dir = os.path.join(dataset_path, "train", "labels")
+    if not os.path.exists(images_dir):
+        return {"error": f"Missing images folder: {images_dir}"}
+
+    started = time.perf_counter()
+
+    names = scan_images(images_dir)
+    sample, strata = stratified_sample(names, labels_dir, sample_size, seed=project_id,
+                                       pool=sample_size * max(1, settings.PREVIEW_STRATIFY_POOL))
+    total = len(names)
+    # Images per class in the whole dataset, scaled up from the label pool
+    pooled = sum(len(group) for group in strata.values())
+    strata_images = {k: len(group) * total / pooled for k, group in strata.items()} if pooled else {}
+
+    shutil.rmtree(preview_dir, ignore_errors=True)
+    os.makedirs(preview_dir, exist_ok=True)
+
+    # Full-resolution timing on a few images drives the run-time estimate
+    timing_dir = os.path.join(preview_dir, ".timing")
+    os.makedirs(timing_dir, exist_ok=True)
+    timings = []
+    for _, name in sample[:max(1, settings.PREVIEW_TIMING_SAMPLES)]:
+        timed = ImageJob(0, name, images_dir, labels_dir,
+                         os.path.join(timing_dir, name), class_names)
+        elapsed = _full_res_seconds(timed)
+        if timed.ok:
+            timings.append(elapsed)
+    shutil.rmtree(timing_dir, ignore_errors=True)
+
+    # Decode at reduced size where the codec supports it, judged by the first image
+    flag = cv2.IMREAD_COLOR
+    if sample:
+        first = cv2.imread(os.path.join(images_dir, sample[0][1]))
+        if first is not None:
+            flag = _reduced_flag(first.shape[1], first.shape[0], settings.PREVIEW_MAX_SIDE)
+        del first
+
+    # Low-res renditions of the whole sample
+    decoded = (
+        (idx, name, _downscale_or_none(cv2.imread(os.path.join(images_dir, name), flag)))
+        for idx, (_, name) in enumerate(sample, start=1)
+    )
+    tagged = attach_detections(
+        decoded, lambda name: label_path_for(labels_dir, name),
+        get_detector(), settings.PIPELINE_DETECTOR_BATCH,
+    )
+
+    stratum_of = {name: k for k, name in sample}
+    per_stratum = defaultdict(lambda: {"images": 0, "objects": 0, "classes": Counter()})
+    images = []
+    for idx, name, frame, detections in tagged:
+        done = process_image(ImageJob(idx, name, images_dir, labels_dir,
+                                      os.path.join(preview_dir, name), class_names,
+                                      frame=frame, decoded=True, detections=detections))
+        if not done.ok:
+            continue
+
+        stats = per_stratum[stratum_of[name]]
+        stats["images"] += 1
+        stats["objects"] += done.count
+        for cls, *_ in done.detections:
+            stats["classes"][_class_name(class_names, cls)] += 1
+
+        images.append({
+            "id": idx,
+            "name": name,
+            "mainImage": url_for(name),
+            "metrics": [
+                {"label": "Total Objects", "value": str(done.count)},
+                {"label": "Detected Classes", "value": ", ".join(done.classes) if done.classes else "None"}
+            ],
+        })
+
+    # Weight each stratum's per-image means by its share of the dataset;
+    # classes the sample was too small to reach use the overall sample mean
+    sampled = [stats for stats in per_stratum.values() if stats["images"]]
+    overall = {"images": sum(st["images"] for st in sampled),
+               "objects": sum(st["objects"] for st in sampled),
+               "classes": sum((st["classes"] for st in sampled), Counter())}
+
+    estimated_objects = 0.0
+    estimated_classes = Counter()
+    for k, images_in_class in strata_images.items():
+        stats = per_stratum[k] if per_stratum[k]["images"] else overall
+        if not stats["images"]:
+            continue
+        weight = images_in_class / stats["images"]
+        estimated_objects += stats["objects"] * weight
+        for label, count in stats["classes"].items():
+            estimated_classes[label] += count * weight
+
+    # Best case for the processing stages alone: a pipeline's pool is capped
+    # by PIPELINE_WORKERS and the node's worker budget, and other pipelines
+    # may hold part of that budget. Cloudinary uploads are not timed.
+    per_image = sum(timings) / len(timings) if timings else 0.0
+    parallel = 1 if settings.PIPELINE_BACKEND == "serial" else max(
+        1, min(settings.PIPELINE_WORKERS, settings.PROCESSING_CPU_BUDGET, os.cpu_count() or 1))
+
+    return {
+        "project_id": project_id,
+        "preview": True,
+        "total_images": total,
+        "sample_size": len(images),
+        "strata": {
+            _class_name(class_names, k): {"images": round(strata_images[k]), "sampled": per_stratum[k]["images"]}
+            for k in strata
+        },
+        "estimate": {
+            "seconds_per_image": round(per_image, 4),
+            "processing_seconds": round(per_image * total / parallel, 1),
+            "workers": parallel,
+            "backend": settings.PIPELINE_BACKEND,
+            "includes_upload": False,
+        },
+        "statistics": {
+            "estimated_total_objects": round(estimated_objects),
+            "estimated_objects_per_image": round(estimated_objects / total, 2) if total else 0,
+            "estimated_class_counts": {
+                label: round(count) for label, count in estimated_classes.most_common()
+            },
+        },
+        "images": images,
+        "elapsed_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def _downscale_or_none(frame):
+    return None if frame is None else _downscale(frame, settings.PREVIEW_MAX_SIDE)
+
+
+def _class_name(class_names, cls):
+    return "Unlabelled" if cls == UNLABELLED else class_label(class_names, cls)
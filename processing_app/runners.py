@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from .frame_ring import FrameRing
+
+# =========================
+# STAGE RUNNERS
+# =========================
+# A runner maps a stage function over items and yields results in input
+# order, keeping at most ``window`` items in flight. ``runner.io`` is the
+# runner used for I/O-bound stages (uploads) that must stay in this process.
+
+BACKENDS = ("serial", "thread", "process", "asyncio")
+
+
+def _ordered(submit, items, window):
+    pending = deque()
+    for item in items:
+        pending.append(submit(item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+class SerialRunner:
+    """Runs every stage inline in the pipeline thread (original behaviour)."""
+
+    def __init__(self, workers: int = 1):
+        self.workers = 1
+        self.io = self
+
+    def map(self, fn, items):
+        for item in items:
+            yield fn(item)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ThreadRunner(SerialRunner):
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self.io = self
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="pipeline")
+
+    def map(self, fn, items):
+        return _ordered(lambda item: self._executor.submit(fn, item), items, self.workers * 2)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+class ProcessRunner(SerialRunner):
+    """CPU stages in worker processes; uploads on a local thread pool since
+    they need this process's Django DB connection.
+
+    Frames already decoded here travel through a shared-memory ring (one
+    slot per in-flight item) instead of being pickled.
+    """
+
+    def __init__(self, workers: int, slot_bytes: int = 0):
+        self.workers = max(1, workers)
+        self._executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"),
+        )
+        self.io = ThreadRunner(self.workers)
+
+        self._ring = None
+        if slot_bytes > 0:
+            try:
+                self._ring = FrameRing(self.workers * 2, slot_bytes)
+            except OSError as e:
+                print("Shared-memory frame ring unavailable, pickling frames:", e)
+
+    def map(self, fn, items):
+        window = self.workers * 2
+        if self._ring is None:
+            return _ordered(lambda item: self._executor.submit(fn, item), items, window)
+
+        ring = self._ring
+        results = _ordered(lambda item: self._executor.submit(fn, ring.put(item)), items, window)
+        return (ring.release(result) for result in results)
+
+    def close(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.io.close()
+        if self._ring is not None:
+            self._ring.close()
+
+
+class AsyncioRunner(SerialRunner):
+    """Drives stages from an asyncio loop on its own thread; blocking stage
+    functions run via ``asyncio.to_thread`` under a concurrency semaphore."""
+
+    def __init__(self, workers: int):
+        self.workers = max(1, workers)
+        self.io = self
+        self._loop = asyncio.new_event_loop()
+        self._loop.set_default_executor(ThreadPoolExecutor(self.workers, thread_name_prefix="pipeline-aio"))
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._semaphore = asyncio.run_coroutine_threadsafe(self._make_semaphore(), self._loop).result()
+
+    async def _make_semaphore(self):
+        return asyncio.Semaphore(self.workers)
+
+    async def _call(self, fn, item):
+        async with self._semaphore:
+            return await asyncio.to_thread(fn, item)
+
+    def map(self, fn, items):
+        return _ordered(
+            lambda item: asyncio.run_coroutine_threadsafe(self._call(fn, item), self._loop),
+            items, self.workers * 2,
+        )
+
+    def close(self):
+        async def _shutdown():
+            await self._loop.shutdown_default_executor()
+
+        asyncio.run_coroutine_threadsafe(_shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+class WorkerBudget:
+    """Worker slots shared by every pipeline on the node, so concurrent
+    projects can't each start a full pool on the same CPUs."""
+
+    def __init__(self, total: int):
+        self.total = max(1, total)
+        self._free = self.total
+        self._cond = threading.Condition()
+
+    def acquire(self, wanted: int, cancel: threading.Event = None) -> int:
+        """Take up to ``wanted`` slots, waiting until at least one is free.
+        Returns how many were taken, or 0 if ``cancel`` was set meanwhile."""
+        with self._cond:
+            while not self._free:
+                if cancel is not None and cancel.is_set():
+                    return 0
+                self._cond.wait(0.5)
+            taken = min(max(1, wanted), self._free)
+            self._free -= taken
+            return taken
+
+    def release(self, taken: int):
+        with self._cond:
+            self._free += taken
+            self._cond.notify_all()
+
+
+def get_runner(backend: str, workers: int, slot_bytes: int = 0):
+    """``slot_bytes`` sizes the process backend's shared-memory frame slots (0 disables)."""
+    runners = {
+        "serial": SerialRunner,
+        "thread": ThreadRunner,
+        "process": ProcessRunner,
+        "asyncio": AsyncioRunner,
+    }
+    if backend not in runners:
+        raise ValueError(f"Unknown pipeline backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    if backend == "process":
+        return ProcessRunner(workers, slot_bytes)
+    return runners[backend](workers)
@@ -0,0 +1,165 @@
+import os
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from .detector import class_label, read_label_file
+from .frame_ring import frame_from_ring
+
+# =========================
+# PIPELINE STAGES
+# =========================
+# Per-image stages are plain functions over an ImageJob so any runner (thread,
+# process or asyncio) can execute them. Everything here must stay picklable
+# and free of Django/DB access; upload and aggregation run in the parent.
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+
+@dataclass
+class ImageJob:
+    idx: int
+    name: str
+    images_dir: str
+    labels_dir: str
+    out_path: str
+    class_names: list
+
+    frame: object = None
+    shared: tuple = None    # frame_ring slot holding the frame, if any
+    decoded: bool = False
+    detections: list = None
+
+    ok: bool = True
+    count: int = 0
+    classes: list = field(default_factory=list)
+    digest: str = ""
+    url: str = ""
+
+    # (stage, start_ns, end_ns, pid, tid) per stage when the job is traced
+    spans: list = None
+
+
+@contextmanager
+def _timed(job: ImageJob, stage: str):
+    if job.spans is None:
+        yield
+        return
+    start = time.time_ns()
+    try:
+        yield
+    finally:
+        job.spans.append((stage, start, time.time_ns(), os.getpid(), threading.get_ident()))
+
+
+def scan_images(images_dir: str):
+    """Image names in natural order (the order record ids follow)."""
+    import natsort
+    from .memory import iter_image_names
+
+    return natsort.natsorted(iter_image_names(images_dir, IMAGE_EXTENSIONS))
+
+
+def label_path_for(labels_dir: str, name: str) -> str:
+    return os.path.join(labels_dir, os.path.splitext(name)[0] + ".txt")
+
+
+def decode_image(job: ImageJob):
+    if job.shared is not None:
+        job.frame = frame_from_ring(job.shared)
+    elif not job.decoded:
+        import cv2
+        job.frame = cv2.imread(os.path.join(job.images_dir, job.name))
+        job.decoded = True
+    job.ok = job.frame is not None
+    return job
+
+
+def parse_labels(job: ImageJob):
+    if job.detections is None:
+        path = label_path_for(job.labels_dir, job.name)
+        job.detections = read_label_file(path) if os.path.exists(path) else []
+    return job
+
+
+def render_detections(job: ImageJob):
+    import cv2
+
+    img = job.frame
+    h, w = img.shape[:2]
+    classes = {}    # first-seen order, identical whichever process renders
+
+    # Ground-truth labels, or model detections for unlabelled images
+    for cls, x, y, bw, bh in job.detections:
+        label = class_label(job.class_names, cls)
+        job.count += 1
+        classes[label] = None
+
+        x1 = int((x - bw / 2) * w)
+        y1 = int((y - bh / 2) * h)
+        x2 = int((x + bw / 2) * w)
+        y2 = int((y + bh / 2) * h)
+
+        cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        cv2.putText(img, label, (x1, max(20, y1 - 5)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+
+    job.classes = list(classes)
+    return job
+
+
+def encode_image(job: ImageJob):
+    """Encode, write to ``out_path`` and hash; the frame is dropped here so
+    only small metadata travels back to the parent."""
+    import cv2
+
+    ok, encoded = cv2.imencode(os.path.splitext(job.name)[1], job.frame)
+    job.frame = None
+
+    if ok:
+        payload = encoded.tobytes()
+        with open(job.out_path, "wb") as out:
+            out.write(payload)
+        job.digest = hashlib.sha256(payload).hexdigest()
+    return job
+
+
+def process_image(job: ImageJob) -> ImageJob:
+    """decode -> parse labels -> render -> encode for one image."""
+    with _timed(job, "decode"):
+        decode_image(job)
+    if not job.ok:
+        job.frame = None
+        return job
+
+    with _timed(job, "parse_labels"):
+        parse_labels(job)
+    with _timed(job, "render"):
+        render_detections(job)
+    with _timed(job, "encode"):
+        encode_image(job)
+    return job
+
+
+def upload_image(job: ImageJob) -> ImageJob:
+    from .image_store import upload_deduplicated
+
+    if job.ok and job.digest:
+        with _timed(job, "upload"):
+            job.url = upload_deduplicated(job.out_path, job.digest)
+    return job
+
+
+def build_record(job: ImageJob) -> dict:
+    return {
+        "id": job.idx,
+        "name": job.name,
+        "mainImage": job.url,
+        "metrics": [
+            {"label": "Total Objects", "value": str(job.count)},
+            {"label": "Detected Classes", "value": ", ".join(job.classes) if job.classes else "None"}
+        ],
+        "_raw": {"count": job.count, "classes": job.classes}
+    }
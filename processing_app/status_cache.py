@@ -0,0 +1,123 @@
+import copy
+import time
+import threading
+
+from django.conf import settings
+
+from .models import ProjectStatus
+
+# =========================
+# IN-MEMORY PROJECT STATUS
+# =========================
+# Pipelines publish every status change here, so polling get-result /
+# get-analytics for a job running in this process never touches the DB.
+# Entries for jobs owned by other processes (or none) are re-read from the
+# DB at most once per PROJECT_STATUS_CACHE_TTL.
+
+_lock = threading.Lock()
+_entries = {}       # project_id -> (status snapshot, fetched_at, local)
+_active = None      # (project_id, fetched_at, local)
+_listing = None     # (project ids, fetched_at)
+
+
+def _ttl():
+    return settings.PROJECT_STATUS_CACHE_TTL
+
+
+def _fresh(fetched_at, local):
+    return local or time.monotonic() - fetched_at < _ttl()
+
+
+def publish(status: ProjectStatus, local: bool = True, activate: bool = False):
+    """Record ``status``. ``local`` marks a job this process is running; its
+    entry stays authoritative until the job publishes with local=False.
+    ``activate`` makes it the default project for calls without project_id.
+    """
+    global _active, _listing
+
+    snapshot = copy.copy(status)
+    project_id = snapshot.project_id
+    now = time.monotonic()
+
+    with _lock:
+        if _listing and project_id not in _listing[0]:
+            _listing = None
+
+        previous = _entries.get(project_id)
+
+        if activate:
+            snapshot.active = True
+            _active = (project_id, now, local)
+            for other_id, (other, fetched_at, other_local) in list(_entries.items()):
+                if other_id != project_id and other.active:
+                    other = copy.copy(other)
+                    other.active = False
+                    _entries[other_id] = (other, fetched_at, other_local)
+        else:
+            # A long-running job's instance holds a stale "active" flag
+            if previous:
+                snapshot.active = previous[0].active
+            if _active and _active[0] == project_id:
+                _active = (project_id, now, local)
+
+        _entries[project_id] = (snapshot, now, local)
+
+
+def _cached(project_id):
+    entry = _entries.get(project_id)
+    if entry and _fresh(entry[1], entry[2]):
+        return entry[0]
+    return None
+
+
+def _store_from_db(status):
+    """Cache a DB read without clobbering a job running in this process."""
+    global _active
+
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(status.project_id)
+        if entry and entry[2]:
+            return entry[0]
+        _entries[status.project_id] = (status, now, False)
+        if status.active and not (_active and _active[2]):
+            _active = (status.project_id, now, False)
+        return status
+
+
+def get_status(project_id: str = None):
+    """Status for ``project_id``, or for the active project when omitted."""
+    with _lock:
+        if project_id:
+            status = _cached(project_id)
+        elif _active and _fresh(_active[1], _active[2]):
+            status = _cached(_active[0])
+        else:
+            status = None
+    if status is not None:
+        return status
+
+    if project_id:
+        status = ProjectStatus.objects.filter(project_id=project_id).first()
+    else:
+        status = ProjectStatus.objects.filter(active=True).first()
+    return _store_from_db(status) if status else None
+
+
+def all_statuses(project_id: str = None):
+    global _listing
+
+    if project_id:
+        status = get_status(project_id)
+        return [status] if status else []
+
+    with _lock:
+        if _listing and _fresh(_listing[1], False):
+            statuses = [_entries[pid][0] for pid in _listing[0] if pid in _entries]
+            if len(statuses) == len(_listing[0]):
+                return statuses
+
+    statuses = [_store_from_db(s) for s in ProjectStatus.objects.order_by("project_id")]
+    with _lock:
+        _listing = ([s.project_id for s in statuses], time.monotonic())
+    return statuses
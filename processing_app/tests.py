@@ -1,3 +1,1072 @@
-from django.test import TestCase
+import io
+import os
+import gzip
+import json
+import shutil
+import tarfile
+import zipfile
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+import warnings
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import (
+    SimpleTestCase, TestCase, TransactionTestCase, RequestFactory, override_settings,
+)
+from django.utils.http import http_date
+
+from aip_project import throttling
+from aip_project.throttling import TokenBucketLimiter, client_ip, parse_rate, rate_limited
+
+from . import api, export, detector, dataset_upload, compression, preview
+from .dataset_upload import UploadError
+from .models import ProjectStatus
+from .export import _parse_range, collect_members, stream_response, tar_stream, zip_stream
+
+
+# =========================
+# STREAMING ARCHIVE EXPORT
+# =========================
+
+class ArchiveStreamTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        self.files = {
+            "images/a.jpg": os.urandom(70000),
+            "images/empty.jpg": b"",
+            "images/b.jpg": os.urandom(513),
+            "result_p.json": b'{"images": []}',
+        }
+        entries = []
+        for arcname, data in self.files.items():
+            path = os.path.join(self.tmp, arcname.replace("/", "_"))
+            with open(path, "wb") as f:
+                f.write(data)
+            entries.append((arcname, path))
+        self.members = collect_members(entries + [("missing.jpg", os.path.join(self.tmp, "nope"))])
+
+    def _bytes(self, stream):
+        data = b"".join(stream.iter_range())
+        self.assertEqual(len(data), stream.size)
+        return data
+
+    def test_collect_members_skips_missing_files(self):
+        self.assertEqual([m.arcname for m in self.members], list(self.files))
+
+    def test_tar_round_trip(self):
+        data = self._bytes(tar_stream(self.members))
+        self.assertEqual(len(data) % tarfile.RECORDSIZE, 0)
+
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            self.assertEqual(tar.getnames(), list(self.files))
+            for arcname, content in self.files.items():
+                self.assertEqual(tar.extractfile(arcname).read(), content)
+
+    def test_zip_round_trip(self):
+        data = self._bytes(zip_stream(self.members))
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), list(self.files))
+            for arcname, content in self.files.items():
+                self.assertEqual(zf.read(arcname), content)
+
+    def test_empty_archives(self):
+        with zipfile.ZipFile(io.BytesIO(self._bytes(zip_stream([])))) as zf:
+            self.assertEqual(zf.namelist(), [])
+        with tarfile.open(fileobj=io.BytesIO(self._bytes(tar_stream([])))) as tar:
+            self.assertEqual(tar.getnames(), [])
+
+    def test_ranges_match_slices_of_the_whole_stream(self):
+        for build in (zip_stream, tar_stream):
+            stream = build(self.members)
+            data = self._bytes(stream)
+            boundaries = [0, 1, 29, 30, 511, 512, 513, 70000, stream.size - 2, stream.size - 1]
+            for start in boundaries:
+                for end in boundaries:
+                    if start <= end:
+                        got = b"".join(stream.iter_range(start, end))
+                        self.assertEqual(got, data[start:end + 1], (build.__name__, start, end))
+
+    def test_etag_follows_member_list(self):
+        self.assertEqual(zip_stream(self.members).etag, zip_stream(self.members).etag)
+        self.assertNotEqual(zip_stream(self.members).etag, zip_stream(self.members[:1]).etag)
+        self.assertNotEqual(zip_stream(self.members).etag, tar_stream(self.members).etag)
+
+
+class RangeRequestTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        path = os.path.join(self.tmp, "a.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(5000))
+        self.stream = tar_stream(collect_members([("a.bin", path)]))
+        self.data = b"".join(self.stream.iter_range())
+        self.factory = RequestFactory()
+
+    def _get(self, **headers):
+        request = self.factory.get("/export", **headers)
+        response = stream_response(request, self.stream, "p.tar")
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_parse_range(self):
+        self.assertEqual(_parse_range("bytes=0-9", 100), (0, 9))
+        self.assertEqual(_parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(_parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(_parse_range("bytes=-500", 100), (0, 99))
+        self.assertEqual(_parse_range("bytes=50-500", 100), (50, 99))
+        self.assertEqual(_parse_range("bytes=100-", 100), "invalid")
+        self.assertEqual(_parse_range("bytes=20-10", 100), "invalid")
+        self.assertIsNone(_parse_range(None, 100))
+        self.assertIsNone(_parse_range("bytes=a-b", 100))
+        self.assertIsNone(_parse_range("bytes=0-1,5-6", 100))
+        self.assertIsNone(_parse_range("items=0-1", 100))
+
+    def test_full_response(self):
+        response, body = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response["Content-Length"], str(self.stream.size))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["ETag"], self.stream.etag)
+
+    def test_partial_response(self):
+        response, body = self._get(HTTP_RANGE="bytes=500-1523")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[500:1524])
+        self.assertEqual(response["Content-Length"], "1024")
+        self.assertEqual(response["Content-Range"], f"bytes 500-1523/{self.stream.size}")
+
+    def test_unsatisfiable_range(self):
+        response, _ = self._get(HTTP_RANGE=f"bytes={self.stream.size}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{self.stream.size}")
+
+    def test_if_range(self):
+        response, body = self._get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=self.stream.etag)
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.data[:10])
+
+        response, body = self._get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+
+
+class AsgiExportTests(SimpleTestCase):
+    """GET /export through the production (uvicorn) ASGI application."""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        images_dir = os.path.join(self.tmp, "dataset", "train", "images")
+        output_dir = os.path.join(self.tmp, "output")
+        os.makedirs(images_dir)
+        os.makedirs(output_dir)
+        with open(os.path.join(self.tmp, "result_asgi.json"), "w") as f:
+            f.write('{"images": []}')
+        for i in range(3):
+            open(os.path.join(images_dir, f"im{i}.jpg"), "wb").close()
+            with open(os.path.join(output_dir, f"asgi_im{i}.jpg"), "wb") as f:
+                f.write(os.urandom(export.COPY_BUFFER_SIZE + 1000))
+
+        for patcher in (
+            mock.patch.object(api, "OUTPUT_DIR", output_dir),
+            mock.patch.dict(api.PROJECT_PATH_MAP, {"asgi": os.path.join(self.tmp, "dataset")}),
+            mock.patch.object(api.status_cache, "get_status", lambda project_id: None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        settings_patch = override_settings(BASE_DIR=self.tmp)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+    def _get(self, path, query):
+        from aip_project.asgi import application
+
+        events = []
+        file_chunks = export._file_chunks
+
+        def traced_chunks(*args):
+            for chunk in file_chunks(*args):
+                events.append("read")
+                yield chunk
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+            "query_string": query.encode(), "root_path": "", "headers": [],
+            "client": ("127.0.0.1", 5000), "server": ("testserver", 80),
+        }
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and message.get("body"):
+                events.append("send")
+            messages.append(message)
+
+        with mock.patch.object(export, "_file_chunks", traced_chunks), \
+                warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            asyncio.run(application(scope, receive, send))
+        return messages, events, caught
+
+    def test_export_streams_under_asgi(self):
+        messages, events, caught = self._get("/api/processing/export", "project_id=asgi&format=zip")
+
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertEqual([str(w.message) for w in caught if "StreamingHttpResponse" in str(w.message)], [])
+
+        # Body chunks go out while image files are still being read
+        self.assertLess(events.index("send"), len(events) - 1 - events[::-1].index("read"))
+
+        body = b"".join(m.get("body", b"") for m in messages[1:])
+        with zipfile.ZipFile(io.BytesIO(body)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(len(zf.namelist()), 4)
+
+
+# =========================
+# RATE LIMITING
+# =========================
+
+class TokenBucketTests(SimpleTestCase):
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/min"), (10, 10 / 60))
+        self.assertEqual(parse_rate("5/s"), (5, 5))
+        self.assertEqual(parse_rate("120 / Hour"), (120, 120 / 3600))
+        with self.assertRaises(KeyError):
+            parse_rate("10/day")
+        with self.assertRaises(ValueError):
+            parse_rate("many/min")
+
+    def test_burst_then_refill(self):
+        now = [1000.0]
+        with mock.patch.object(throttling.time, "monotonic", lambda: now[0]):
+            limiter = TokenBucketLimiter(3, 1.0)
+            self.assertEqual([limiter.acquire("a")[0] for _ in range(4)], [True, True, True, False])
+
+            allowed, retry_after = limiter.acquire("a")
+            self.assertFalse(allowed)
+            self.assertAlmostEqual(retry_after, 1.0)
+
+            # Other clients have their own bucket
+            self.assertTrue(limiter.acquire("b")[0])
+
+            now[0] += 0.5
+            allowed, retry_after = limiter.acquire("a")
+            self.assertFalse(allowed)
+            self.assertAlmostEqual(retry_after, 0.5)
+
+            now[0] += 0.5
+            self.assertTrue(limiter.acquire("a")[0])
+            self.assertFalse(limiter.acquire("a")[0])
+
+            # Refill is capped at the burst size
+            now[0] += 60
+            self.assertEqual([limiter.acquire("a")[0] for _ in range(4)], [True, True, True, False])
+
+    def test_client_table_is_bounded(self):
+        limiter = TokenBucketLimiter(1, 1.0)
+        with mock.patch.object(TokenBucketLimiter, "MAX_CLIENTS", 2):
+            for key in ("a", "b", "c"):
+                limiter.acquire(key)
+        self.assertEqual(list(limiter._buckets), ["b", "c"])
+
+    def test_rate_limited_view(self):
+        view = rate_limited("test")(lambda request: "ok")
+        request = RequestFactory().get("/", REMOTE_ADDR="203.0.113.9")
+        with override_settings(RATE_LIMITS={"test": "2/min"}), \
+                mock.patch.dict(throttling._limiters, clear=True):
+            self.assertEqual([view(request), view(request)], ["ok", "ok"])
+            response = view(request)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+
+
+@override_settings(RATE_LIMITS={"processing": "3/min", "processing_control": "2/min"})
+class ProcessingRateLimitTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(throttling._limiters, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_polling_does_not_starve_control_endpoints(self):
+        poll = lambda: self.client.get("/api/processing/project-status").status_code
+        cancel = lambda: self.client.post("/api/processing/cancel-processing", {"project_id": "nope"},
+                                          content_type="application/json").status_code
+
+        self.assertEqual([poll() for _ in range(4)], [200, 200, 200, 429])
+        self.assertEqual([cancel() for _ in range(3)], [200, 200, 429])
+
+
+class ClientIpTests(SimpleTestCase):
+    def _request(self, remote, forwarded=None):
+        meta = {"REMOTE_ADDR": remote}
+        if forwarded is not None:
+            meta["HTTP_X_FORWARDED_FOR"] = forwarded
+        return RequestFactory().get("/", **meta)
+
+    @override_settings(TRUSTED_PROXIES=[])
+    def test_forwarded_for_ignored_without_trusted_proxies(self):
+        self.assertEqual(client_ip(self._request("198.51.100.7", "1.2.3.4")), "198.51.100.7")
+
+    @override_settings(TRUSTED_PROXIES=["10.0.0.0/8", "192.0.2.1"])
+    def test_forwarded_for_ignored_from_untrusted_peer(self):
+        self.assertEqual(client_ip(self._request("198.51.100.7", "1.2.3.4")), "198.51.100.7")
+
+    @override_settings(TRUSTED_PROXIES=["10.0.0.0/8", "192.0.2.1"])
+    def test_right_most_untrusted_hop_from_trusted_proxy(self):
+        # A client-supplied left-most hop can't choose the key
+        request = self._request("10.1.2.3", "6.6.6.6, 203.0.113.5, 192.0.2.1")
+        self.assertEqual(client_ip(request), "203.0.113.5")
+
+    @override_settings(TRUSTED_PROXIES=["10.0.0.0/8"])
+    def test_trusted_proxy_without_usable_hop(self):
+        self.assertEqual(client_ip(self._request("10.1.2.3")), "10.1.2.3")
+        self.assertEqual(client_ip(self._request("10.1.2.3", "10.9.9.9")), "10.1.2.3")
+
+
+# =========================
+# COMPRESSED JSON RESPONSES
+# =========================
+
+class CompressedJsonTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, "data.json")
+        self._write({"images": list(range(500))}, mtime=1700000000)
+        self.factory = RequestFactory()
+
+    def _write(self, data, mtime):
+        with open(self.path, "w") as f:
+            json.dump(data, f)
+        os.utime(self.path, (mtime, mtime))
+
+    def _get(self, **headers):
+        return compression.json_file_response(self.factory.get("/", **headers), self.path, [])
+
+    def test_negotiate(self):
+        negotiate = lambda header: compression._negotiate(
+            self.factory.get("/", HTTP_ACCEPT_ENCODING=header))[0]
+
+        self.assertIsNone(negotiate(""))
+        self.assertIsNone(negotiate("identity, deflate"))
+        self.assertEqual(negotiate("gzip, deflate"), "gzip")
+        self.assertEqual(negotiate("GZIP;q=0.5"), "gzip")
+        self.assertIsNone(negotiate("gzip;q=0"))
+        self.assertIsNone(negotiate("gzip;q=abc"))
+        self.assertEqual(negotiate("br, gzip"), "br" if compression.brotli else "gzip")
+        with mock.patch.object(compression, "brotli", None):
+            self.assertEqual(negotiate("br, gzip"), "gzip")
+            self.assertIsNone(negotiate("br"))
+
+    def test_gzip_and_identity_bodies(self):
+        with open(self.path, "rb") as f:
+            source = f.read()
+
+        plain = self._get()
+        self.assertEqual(plain.status_code, 200)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        self.assertEqual(plain.content, source)
+        self.assertEqual(plain["Vary"], "Accept-Encoding")
+
+        zipped = self._get(HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(zipped["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(zipped.content), source)
+        self.assertLess(len(zipped.content), len(source))
+
+        excluded = self._get(HTTP_ACCEPT_ENCODING="gzip;q=0, identity")
+        self.assertFalse(excluded.has_header("Content-Encoding"))
+        self.assertEqual(excluded.content, source)
+
+    def test_etag_is_per_coding(self):
+        plain_etag = self._get()["ETag"]
+        gzip_etag = self._get(HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+        self.assertNotEqual(plain_etag, gzip_etag)
+        self.assertTrue(gzip_etag.endswith('-gzip"'))
+
+        self.assertEqual(self._get(HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=gzip_etag).status_code, 304)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=plain_etag).status_code, 304)
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=f"W/{plain_etag}").status_code, 304)
+
+        # A cached gzip body must not validate an identity request, or vice versa
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=gzip_etag).status_code, 200)
+        self.assertEqual(self._get(HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=plain_etag).status_code, 200)
+
+        not_modified = self._get(HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=f'"x", {gzip_etag}')
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], gzip_etag)
+
+    def test_if_modified_since(self):
+        self.assertEqual(self._get(HTTP_IF_MODIFIED_SINCE=http_date(1700000000)).status_code, 304)
+        self.assertEqual(self._get(HTTP_IF_MODIFIED_SINCE=http_date(1700000100)).status_code, 304)
+        self.assertEqual(self._get(HTTP_IF_MODIFIED_SINCE=http_date(1699999999)).status_code, 200)
+        self.assertEqual(self._get(HTTP_IF_MODIFIED_SINCE="not a date").status_code, 200)
+
+        # If-None-Match wins over If-Modified-Since
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH='"other"',
+                                   HTTP_IF_MODIFIED_SINCE=http_date(1700000000)).status_code, 200)
+
+    def test_hand_edited_source_rebuilds_variant(self):
+        first = self._get(HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(os.stat(self.path + ".gz").st_mtime, 1700000000)
+
+        self._write({"edited": True}, mtime=1700000500)
+        second = self._get(HTTP_ACCEPT_ENCODING="gzip")
+
+        self.assertEqual(second["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(second.content)), {"edited": True})
+        self.assertNotEqual(first["ETag"], second["ETag"])
+        self.assertEqual(os.stat(self.path + ".gz").st_mtime, 1700000500)
+        self.assertEqual(sorted(os.listdir(self.tmp)), ["data.json", "data.json.gz"]
+                         if compression.brotli is None else ["data.json", "data.json.br", "data.json.gz"])
+
+    def test_missing_file_serves_default(self):
+        response = compression.json_file_response(self.factory.get("/"), self.path + ".nope", {"a": 1})
+        self.assertEqual(json.loads(response.content), {"a": 1})
+
+    def test_encoded_json_response(self):
+        stat = os.stat(self.path)
+        response = compression.encoded_json_response(
+            self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip"), b'{"x": 1}', stat)
+        self.assertEqual(gzip.decompress(response.content), b'{"x": 1}')
+        self.assertEqual(response["ETag"], compression.make_etag(stat, "gzip"))
+
+        request = self.factory.get("/", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(compression.not_modified_response(request, stat).status_code, 304)
+        self.assertIsNone(compression.not_modified_response(
+            self.factory.get("/", HTTP_IF_NONE_MATCH=response["ETag"]), stat))
+
+
+# =========================
+# DATASET UPLOAD
+# =========================
+
+def _dataset_zip(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+DATASET_FILES = {
+    "ds/data.yaml": "names: [truck]\n",
+    "ds/train/images/a.jpg": b"\xff\xd8" + b"\0" * 4000,
+    "ds/train/labels/a.txt": "0 0.5 0.5 0.2 0.2\n",
+}
+
+
+class DatasetUploadTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.uploads = os.path.join(self.tmp, "uploads")
+        self.datasets = os.path.join(self.tmp, "datasets")
+        os.makedirs(self.uploads)
+        os.makedirs(self.datasets)
+
+    def _upload(self, data, sha256=None, project_id="proj"):
+        manifest = dataset_upload.create_upload(
+            self.uploads, project_id, "ds.zip", len(data),
+            sha256 or hashlib.sha256(data).hexdigest(), 1024)
+        return manifest["upload_id"]
+
+    def _wait(self, upload_id):
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            manifest = dataset_upload.get_upload(self.uploads, upload_id)
+            if manifest["status"] != "finalizing":
+                return manifest
+            time.sleep(0.02)
+        self.fail("finalize did not finish")
+
+    def test_write_chunk_offsets(self):
+        upload_id = self._upload(b"0123456789")
+        write = lambda offset, data, sha=None: dataset_upload.write_chunk(
+            self.uploads, upload_id, offset, [data], sha)
+
+        self.assertEqual(write(0, b"0123")["received_bytes"], 4)
+        with self.assertRaisesMessage(UploadError, "does not match received bytes 4"):
+            write(5, b"56")
+        with self.assertRaises(UploadError):
+            write(-1, b"x")
+
+        # Re-sending an earlier chunk (after a dropped connection) is allowed
+        self.assertEqual(write(2, b"23456")["received_bytes"], 7)
+        with self.assertRaisesMessage(UploadError, "exceeds declared total_size"):
+            write(7, b"7890")
+        self.assertEqual(write(7, b"789")["received_bytes"], 10)
+
+        with open(dataset_upload._data_path(self.uploads, upload_id), "rb") as f:
+            self.assertEqual(f.read(), b"0123456789")
+
+    def test_chunk_checksum_mismatch_truncates_to_offset(self):
+        upload_id = self._upload(b"0123456789")
+        dataset_upload.write_chunk(self.uploads, upload_id, 0, [b"0123"])
+
+        with self.assertRaisesMessage(UploadError, "Chunk checksum mismatch"):
+            dataset_upload.write_chunk(self.uploads, upload_id, 4, [b"45", b"67"],
+                                       hashlib.sha256(b"other").hexdigest())
+        self.assertEqual(dataset_upload.get_upload(self.uploads, upload_id)["received_bytes"], 4)
+
+        manifest = dataset_upload.write_chunk(self.uploads, upload_id, 4, [b"4567"],
+                                              hashlib.sha256(b"4567").hexdigest())
+        self.assertEqual(manifest["received_bytes"], 8)
+
+    def test_invalid_upload_ids(self):
+        for upload_id in ("../etc", "", "0" * 31):
+            with self.assertRaises(UploadError):
+                dataset_upload.get_upload(self.uploads, upload_id)
+        with self.assertRaises(UploadError):
+            dataset_upload.create_upload(self.uploads, "../x", "a.zip", 1, "0" * 64, 1)
+
+    def test_extract_rejects_zip_slip(self):
+        for name in ("../evil.txt", "ds/../../evil.txt", "/tmp/evil.txt"):
+            archive = os.path.join(self.tmp, "slip.zip")
+            with open(archive, "wb") as f:
+                f.write(_dataset_zip({"ds/ok.txt": "ok", name: "pwned"}))
+
+            extract_dir = os.path.join(self.tmp, "extract")
+            with self.assertRaisesMessage(UploadError, "Unsafe path in archive"):
+                dataset_upload._extract_zip(archive, extract_dir)
+            self.assertFalse(os.path.exists(os.path.join(self.tmp, "evil.txt")))
+            shutil.rmtree(extract_dir, ignore_errors=True)
+
+    def _finalize(self, data, sha256=None, max_bytes=0, on_ready=None):
+        upload_id = self._upload(data, sha256)
+        dataset_upload.write_chunk(self.uploads, upload_id, 0, [data])
+        manifest = dataset_upload.start_finalize(self.uploads, upload_id, self.datasets,
+                                                 max_bytes, on_ready)
+        self.assertIn(manifest["status"], ("finalizing", "completed", "failed"))
+        return upload_id, self._wait(upload_id)
+
+    def test_archive_checksum_mismatch_fails(self):
+        data = _dataset_zip(DATASET_FILES)
+        upload_id, manifest = self._finalize(data, sha256=hashlib.sha256(b"x").hexdigest())
+
+        self.assertEqual(manifest["status"], "failed")
+        self.assertEqual(manifest["error"], "Archive checksum mismatch")
+        self.assertFalse(manifest["completed"])
+        self.assertEqual(os.listdir(self.datasets), [])
+
+    def test_extracted_size_limit(self):
+        data = _dataset_zip(DATASET_FILES)
+        size = sum(len(v) for v in DATASET_FILES.values())
+
+        _, manifest = self._finalize(data, max_bytes=size - 1)
+        self.assertEqual(manifest["status"], "failed")
+        self.assertIn(f"expands to {size} bytes", manifest["error"])
+        self.assertEqual(os.listdir(self.datasets), [])
+
+        _, manifest = self._finalize(data, max_bytes=size)
+        self.assertEqual(manifest["status"], "completed")
+
+    def test_incomplete_upload_is_refused_synchronously(self):
+        upload_id = self._upload(b"0123456789")
+        with self.assertRaisesMessage(UploadError, "Upload incomplete: 0/10 bytes"):
+            dataset_upload.start_finalize(self.uploads, upload_id, self.datasets)
+        self.assertEqual(dataset_upload.get_upload(self.uploads, upload_id)["status"], "uploading")
+
+
+class UploadCompleteApiTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        for name, value in (("UPLOAD_DIR", "uploads"), ("BASE_DATASET_DIR", "datasets")):
+            os.makedirs(os.path.join(self.tmp, value))
+            patcher = mock.patch.object(api, name, os.path.join(self.tmp, value))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for patcher in (
+            mock.patch.object(api, "DATASET_REGISTRY", os.path.join(self.tmp, "registry.json")),
+            mock.patch.dict(api.PROJECT_PATH_MAP),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_complete_finalizes_in_background_and_registers(self):
+        data = _dataset_zip(DATASET_FILES)
+        factory = RequestFactory()
+        manifest = dataset_upload.create_upload(api.UPLOAD_DIR, "uploaded", "ds.zip", len(data),
+                                                hashlib.sha256(data).hexdigest(), 1024)
+        upload_id = manifest["upload_id"]
+        dataset_upload.write_chunk(api.UPLOAD_DIR, upload_id, 0, [data])
+
+        # Hold the background finalize until the "finalizing" state is checked
+        release = threading.Event()
+        finalize = dataset_upload.finalize_upload
+        calls = []
+
+        def held_finalize(*args):
+            calls.append(args)
+            release.wait(10)
+            return finalize(*args)
+
+        with mock.patch.object(dataset_upload, "finalize_upload", held_finalize):
+            response = api.upload_complete(factory.post("/"), upload_id, api.UploadCompleteRequest())
+            self.assertEqual(response["status"], "finalizing")
+            self.assertNotIn("uploaded", api.PROJECT_PATH_MAP)
+
+            # A second complete while finalizing doesn't start another run
+            again = api.upload_complete(factory.post("/"), upload_id, api.UploadCompleteRequest())
+            self.assertEqual(again["status"], "finalizing")
+            release.set()
+
+            deadline = time.monotonic() + 10
+            while api.upload_status(factory.get("/"), upload_id)["status"] == "finalizing":
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.02)
+
+        manifest = api.upload_status(factory.get("/"), upload_id)
+        dataset_path = os.path.join(api.BASE_DATASET_DIR, "uploaded")
+        self.assertEqual(manifest["status"], "completed")
+        self.assertTrue(manifest["completed"])
+        self.assertEqual(manifest["dataset_path"], dataset_path)
+        self.assertEqual(api.PROJECT_PATH_MAP["uploaded"], dataset_path)
+        self.assertEqual(api.safe_load_json(api.DATASET_REGISTRY, {}), {"uploaded": dataset_path})
+        with open(os.path.join(dataset_path, "train", "labels", "a.txt")) as f:
+            self.assertEqual(f.read(), DATASET_FILES["ds/train/labels/a.txt"])
+
+        self.assertEqual(len(calls), 1)
+
+        # Completing again is a no-op returning the finished manifest
+        self.assertEqual(api.upload_complete(factory.post("/"), upload_id,
+                                             api.UploadCompleteRequest())["status"], "completed")
+
+
+# =========================
+# DETECTOR
+# =========================
+
+TINY_YOLO = os.path.join(os.path.dirname(__file__), "testdata", "tiny_yolo.onnx")
+
+
+class DetectorTests(SimpleTestCase):
+    def _detector(self, input_size=640, conf=0.25, nms=0.45):
+        # _parse only needs the thresholds, not a loaded network
+        det = detector.YoloDetector.__new__(detector.YoloDetector)
+        det.input_size, det.conf_threshold, det.nms_threshold = input_size, conf, nms
+        return det
+
+    @override_settings(PIPELINE_DETECTOR_INPUT_SIZE=640, PIPELINE_DETECTOR_CONF=0.25,
+                       PIPELINE_DETECTOR_NMS=0.45, PIPELINE_DETECTOR_THREADS=0)
+    def test_tiny_model_finds_the_centre_box(self):
+        import numpy as np
+
+        with override_settings(PIPELINE_DETECTOR_MODEL=""):
+            self.assertIsNone(detector.get_detector())
+
+        with override_settings(PIPELINE_DETECTOR_MODEL=TINY_YOLO), \
+                mock.patch.dict(detector._detectors, clear=True):
+            det = detector.get_detector()
+            self.assertIs(detector.get_detector(), det)
+            frames = [np.zeros((480, 640, 3), np.uint8), np.full((300, 200, 3), 200, np.uint8)]
+            results = det.detect_batch(frames)
+
+        self.assertEqual(len(results), 2)
+        for detections in results:
+            self.assertEqual(len(detections), 1)
+            cls, *box = detections[0]
+            self.assertEqual(cls, 0)
+            for value in box:
+                self.assertAlmostEqual(value, 0.5, places=3)
+
+    def test_parse_v5_layout(self):
+        import numpy as np
+
+        # (anchors, 5 + nc): score = objectness * class probability
+        pred = np.zeros((10, 7), np.float32)
+        pred[0] = [320, 160, 64, 32, 0.9, 0.1, 0.8]
+        pred[1] = [100, 100, 10, 10, 0.2, 0.9, 0.0]  # 0.18 < conf threshold
+        detections = self._detector()._parse(pred)
+
+        self.assertEqual(len(detections), 1)
+        cls, x, y, w, h = detections[0]
+        self.assertEqual(cls, 1)
+        self.assertEqual([round(v, 3) for v in (x, y, w, h)], [0.5, 0.25, 0.1, 0.05])
+
+    def test_nms_is_per_class(self):
+        import numpy as np
+
+        # v8 layout (4 + nc, anchors): three near-identical boxes, two classes
+        pred = np.zeros((6, 16), np.float32)
+        pred[:, 0] = [320, 320, 100, 100, 0.9, 0.0]
+        pred[:, 1] = [322, 320, 100, 100, 0.8, 0.0]
+        pred[:, 2] = [320, 322, 100, 100, 0.0, 0.7]
+        detections = self._detector()._parse(pred)
+
+        self.assertEqual(sorted(d[0] for d in detections), [0, 1])
+        self.assertEqual(self._detector()._parse(np.zeros((6, 16), np.float32)), [])
+
+    def test_attach_detections_keeps_order_across_batches(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        labelled = {"b", "e"}
+        for name in labelled:
+            with open(os.path.join(tmp, name + ".txt"), "w") as f:
+                f.write("3 0.1 0.2 0.3 0.4\n")
+
+        class FakeDetector:
+            batches = []
+
+            def detect_batch(self, frames):
+                self.batches.append(list(frames))
+                return [[(7, frame, 0, 0, 0)] for frame in frames]
+
+        fake = FakeDetector()
+        # frame None: labelled frames left for a worker, or unreadable images
+        frames = [(1, "a", 10), (2, "b", None), (3, "c", 30), (4, "d", None),
+                  (5, "e", 50), (6, "f", 60), (7, "g", 70)]
+        out = list(detector.attach_detections(
+            iter(frames), lambda name: os.path.join(tmp, name + ".txt"), fake, batch_size=2))
+
+        self.assertEqual([(idx, name, frame) for idx, name, frame, _ in out], frames)
+        self.assertEqual([d for *_, d in out], [
+            [(7, 10, 0, 0, 0)], [(3, 0.1, 0.2, 0.3, 0.4)], [(7, 30, 0, 0, 0)], [],
+            [(3, 0.1, 0.2, 0.3, 0.4)], [(7, 60, 0, 0, 0)], [(7, 70, 0, 0, 0)],
+        ])
+        self.assertEqual(fake.batches, [[10, 30], [60, 70]])
+
+        # Without a detector unlabelled images get no detections
+        out = list(detector.attach_detections(iter(frames[:3]), lambda name: os.path.join(tmp, name + ".txt")))
+        self.assertEqual([d for *_, d in out], [[], [(3, 0.1, 0.2, 0.3, 0.4)], []])
+
+
+# =========================
+# CHECKPOINT / RESUME
+# =========================
+
+def _fake_upload(path, **kwargs):
+    return {"secure_url": f"https://res.example/{kwargs['public_id']}"}
+
+
+class GeneratedDatasetMixin:
+    """A small YOLO dataset plus output/checkpoint dirs in a temp BASE_DIR."""
+
+    IMAGES = 14
+
+    def setUp(self):
+        import cv2
+        import numpy as np
+
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        self.dataset = os.path.join(self.tmp, "dataset")
+        images_dir = os.path.join(self.dataset, "train", "images")
+        labels_dir = os.path.join(self.dataset, "train", "labels")
+        os.makedirs(images_dir)
+        os.makedirs(labels_dir)
+        with open(os.path.join(self.dataset, "data.yaml"), "w") as f:
+            f.write("names: [truck, car]\n")
+
+        # im2.jpg sorts before im10.jpg: record ids follow natural order
+        for i in range(self.IMAGES):
+            frame = np.full((24, 32, 3), i * 15, dtype=np.uint8)
+            cv2.imwrite(os.path.join(images_dir, f"im{i}.jpg"), frame)
+            if i % 3:
+                with open(os.path.join(labels_dir, f"im{i}.txt"), "w") as f:
+                    f.write(f"{i % 2} 0.5 0.5 0.2 0.2\n" * (i % 4 + 1))
+
+        for name, value in (("OUTPUT_DIR", "output"), ("CHECKPOINT_DIR", "checkpoints")):
+            os.makedirs(os.path.join(self.tmp, value))
+            patcher = mock.patch.object(api, name, os.path.join(self.tmp, value))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch("cloudinary.uploader.upload", _fake_upload)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        settings_patch = override_settings(BASE_DIR=self.tmp)
+        settings_patch.enable()
+        self.addCleanup(settings_patch.disable)
+
+    def _run(self, project_id, memory_budget_mb=0, cancel_after=None, workers=1):
+        status, _ = ProjectStatus.objects.get_or_create(project_id=project_id)
+        cancel = api.threading.Event()
+        build_record = api.build_record
+
+        def build_then_cancel(job):
+            if job.idx == cancel_after:
+                cancel.set()
+            return build_record(job)
+
+        with mock.patch.object(api, "build_record", build_then_cancel):
+            api._process_dataset(status, project_id, self.dataset, cancel, workers, memory_budget_mb)
+
+    def _result(self, project_id):
+        with open(os.path.join(self.tmp, f"result_{project_id}.json")) as f:
+            return json.load(f)
+
+
+@override_settings(PIPELINE_BACKEND="serial", PIPELINE_CHECKPOINT_EVERY=4,
+                   PIPELINE_RESULT_BATCH=3, PIPELINE_DETECTOR_MODEL="")
+class CancelResumeTests(GeneratedDatasetMixin, TestCase):
+
+    def _assert_resume_matches_full_run(self, memory_budget_mb):
+        self._run("full", memory_budget_mb)
+        expected = self._result("full")
+        self.assertEqual([r["id"] for r in expected["images"]], list(range(1, self.IMAGES + 1)))
+        self.assertEqual(expected["images"][2]["name"], "im2.jpg")
+
+        with self.assertRaises(api.PipelineCancelled):
+            self._run("resumed", memory_budget_mb, cancel_after=6)
+
+        checkpoint = api.safe_load_json(api._checkpoint_path("resumed"), None)
+        self.assertEqual(checkpoint["next_index"], 6)
+        self.assertEqual(checkpoint["last_image"], "im5.jpg")
+        self.assertEqual(checkpoint["spool_size"], os.path.getsize(api._spool_path("resumed")))
+
+        self._run("resumed", memory_budget_mb)
+        resumed = self._result("resumed")
+        self.assertEqual(resumed["images"], expected["images"])
+
+    def test_resume_continues_records(self):
+        self._assert_resume_matches_full_run(0)
+
+    def test_resume_continues_records_memory_bounded(self):
+        self._assert_resume_matches_full_run(512)
+
+    def test_checkpoint_for_another_listing_is_ignored(self):
+        with self.assertRaises(api.PipelineCancelled):
+            self._run("p", cancel_after=6)
+
+        os.remove(os.path.join(self.dataset, "train", "images", "im3.jpg"))
+        self._run("p")
+        names = [r["name"] for r in self._result("p")["images"]]
+        self.assertEqual(len(names), self.IMAGES - 1)
+        self.assertNotIn("im3.jpg", names)
+
+
+# =========================
+# STAGE RUNNERS
+# =========================
+
+@override_settings(PIPELINE_CHECKPOINT_EVERY=4, PIPELINE_RESULT_BATCH=3, PIPELINE_DETECTOR_MODEL="")
+class RunnerBackendTests(GeneratedDatasetMixin, TransactionTestCase):
+    # Thread and asyncio backends upload (and so hit the DB) from pool threads
+
+    def test_backends_produce_identical_results(self):
+        results = {}
+        for backend in ("serial", "thread", "asyncio"):
+            with self.subTest(backend=backend), override_settings(PIPELINE_BACKEND=backend):
+                self._run(backend, workers=3)
+                results[backend] = self._result(backend)
+                self.assertEqual(results[backend].pop("project_id"), backend)
+
+        self.assertEqual(len(results["serial"]["images"]), self.IMAGES)
+        self.assertEqual(results["thread"], results["serial"])
+        self.assertEqual(results["asyncio"], results["serial"])
+
+    def test_runners_keep_input_order(self):
+        from .runners import get_runner
+
+        def slow_square(n):
+            time.sleep(0.001 * (n % 3))
+            return n * n
+
+        for backend in ("serial", "thread", "asyncio"):
+            with get_runner(backend, 3) as runner:
+                self.assertEqual(list(runner.map(slow_square, range(20))), [n * n for n in range(20)])
+
+        with self.assertRaises(ValueError):
+            get_runner("gpu", 1)
+
+
+class WorkerBudgetTests(SimpleTestCase):
+    def test_partial_grants_and_release(self):
+        from .runners import WorkerBudget
+
+        budget = WorkerBudget(4)
+        self.assertEqual(budget.acquire(3), 3)
+        self.assertEqual(budget.acquire(3), 1)     # only one slot left
+        budget.release(3)
+        self.assertEqual(budget.acquire(0), 1)     # at least one
+        self.assertEqual(budget.acquire(9), 2)
+        self.assertEqual(WorkerBudget(0).total, 1)
+
+    def test_waits_for_a_slot_and_honours_cancel(self):
+        from .runners import WorkerBudget
+
+        budget = WorkerBudget(1)
+        self.assertEqual(budget.acquire(1), 1)
+
+        cancel = threading.Event()
+        cancel.set()
+        self.assertEqual(budget.acquire(1, cancel), 0)
+
+        granted = []
+        waiter = threading.Thread(target=lambda: granted.append(budget.acquire(2, threading.Event())))
+        waiter.start()
+        time.sleep(0.05)
+        self.assertEqual(granted, [])
+        budget.release(1)
+        waiter.join(5)
+        self.assertEqual(granted, [1])
+
+
+class FrameRingTests(SimpleTestCase):
+    def setUp(self):
+        from .frame_ring import FrameRing
+
+        self.ring = FrameRing(2, 64)
+        self.addCleanup(self.ring.close)
+
+    def _job(self, frame):
+        from .stages import ImageJob
+
+        return ImageJob(0, "im.jpg", "", "", "", [], frame=frame)
+
+    def _read(self, shared):
+        from . import frame_ring
+
+        view = frame_ring.frame_from_ring(shared)
+        data = view.copy()
+        del view
+        # detach this process's mapping so the segment can go away
+        frame_ring._attached.pop(shared[0]).close()
+        return data
+
+    def test_put_moves_frame_into_a_slot(self):
+        import numpy as np
+
+        frame = np.arange(24, dtype=np.uint8).reshape(2, 4, 3)
+        job = self.ring.put(self._job(frame))
+
+        self.assertIsNone(job.frame)
+        name, slot, offset, shape, dtype = job.shared
+        self.assertEqual((name, offset, shape, dtype), (self.ring.name, slot * 64, (2, 4, 3), "|u1"))
+        np.testing.assert_array_equal(self._read(job.shared), frame)
+
+        self.ring.release(job)
+        self.assertIsNone(job.shared)
+
+    def test_oversized_or_missing_frames_are_left_alone(self):
+        import numpy as np
+
+        big = np.zeros(65, dtype=np.uint8)
+        job = self.ring.put(self._job(big))
+        self.assertIs(job.frame, big)
+        self.assertIsNone(job.shared)
+
+        job = self.ring.put(self._job(None))
+        self.assertIsNone(job.shared)
+
+    def test_full_ring_falls_back_until_a_slot_is_released(self):
+        import numpy as np
+
+        frame = np.ones(8, dtype=np.float32)
+        first, second, third = (self.ring.put(self._job(frame.copy())) for _ in range(3))
+
+        self.assertEqual({first.shared[1], second.shared[1]}, {0, 1})
+        self.assertIsNone(third.shared)          # every slot in flight
+        self.assertIsNotNone(third.frame)
+
+        freed = first.shared[1]
+        self.ring.release(first)
+        self.ring.release(first)                 # second release is a no-op
+        fourth = self.ring.put(self._job(frame.copy()))
+        self.assertEqual(fourth.shared[1], freed)
+        np.testing.assert_array_equal(self._read(fourth.shared), frame)
+        self.assertIsNone(self.ring.put(self._job(frame.copy())).shared)
+
+
+# =========================
+# SAMPLED PREVIEW
+# =========================
+
+@override_settings(PIPELINE_DETECTOR_MODEL="", PIPELINE_BACKEND="thread", PIPELINE_WORKERS=8,
+                   PROCESSING_CPU_BUDGET=2)
+class PreviewTests(GeneratedDatasetMixin, SimpleTestCase):
+    def _preview(self, sample_size):
+        return preview.run_preview("p1", self.dataset, ["truck", "car"], sample_size,
+                                   os.path.join(self.tmp, "preview"), lambda name: name)
+
+    def test_small_pool_reads_only_pooled_labels(self):
+        with override_settings(PREVIEW_STRATIFY_POOL=1), \
+                mock.patch.object(preview, "_primary_class", wraps=preview._primary_class) as primary:
+            result = self._preview(4)
+
+        self.assertEqual(primary.call_count, 4)
+        self.assertEqual(result["sample_size"], 4)
+        self.assertEqual(result["total_images"], self.IMAGES)
+        # Per-class counts are scaled from the pool to the whole dataset
+        self.assertAlmostEqual(sum(s["images"] for s in result["strata"].values()), self.IMAGES, delta=2)
+
+    def test_full_pool_counts_and_estimate(self):
+        with mock.patch.object(preview.os, "cpu_count", return_value=16):
+            result = self._preview(6)
+
+        self.assertEqual({k: v["images"] for k, v in result["strata"].items()},
+                         {"Unlabelled": 5, "car": 5, "truck": 4})
+        self.assertEqual(sum(v["sampled"] for v in result["strata"].values()), 6)
+
+        estimate = result["estimate"]
+        self.assertNotIn("full_run_seconds", estimate)
+        self.assertEqual(estimate["workers"], 2)     # capped by the worker budget
+        self.assertFalse(estimate["includes_upload"])
+        self.assertAlmostEqual(estimate["processing_seconds"],
+                               estimate["seconds_per_image"] * self.IMAGES / 2, delta=0.1)
+
+
+# =========================
+# PROJECT STATUS WRITES
+# =========================
+
+class ConcurrentStatusWriteTests(TransactionTestCase):
+    """start-processing while another pipeline keeps writing its progress."""
+
+    def test_start_project_while_a_pipeline_writes(self):
+        dataset = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dataset)
+        writer = ProjectStatus.objects.create(project_id="writer", running=True)
+
+        stop = threading.Event()
+        errors = []
+
+        def write_progress():
+            try:
+                n = 0
+                while not stop.is_set():
+                    n += 1
+                    api._save_progress(writer, processed_images=n)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=write_progress)
+        with mock.patch.dict(api.PROJECT_PATH_MAP, {"p": dataset}), \
+                mock.patch.object(api, "run_pipeline", lambda *args: None):
+            thread.start()
+            try:
+                for _ in range(40):
+                    self.assertEqual(api.start_project("p"), {"message": "Processing started for p"})
+                    with api._running_lock:
+                        api._running_projects.discard("p")
+            finally:
+                stop.set()
+                thread.join()
+
+        self.assertEqual(errors, [])
+        status = ProjectStatus.objects.get(project_id="p")
+        self.assertTrue(status.active and status.running)
+        self.assertFalse(ProjectStatus.objects.get(project_id="writer").active)
+        self.assertEqual(ProjectStatus.objects.count(), 2)